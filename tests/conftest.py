@@ -1,6 +1,9 @@
 import sys
 import os
 
+import pytest
+from yatube.runner import isolated_settings
+
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
@@ -32,3 +35,22 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    # миниатюры в тестах создаются сразу, а не фоновым потоком,
+    # который может писать во временный MEDIA_ROOT уже после теста
+    settings.THUMBNAIL_ASYNC = False
+
+
+@pytest.fixture(scope='session')
+def isolated_directory(tmp_path_factory):
+    return tmp_path_factory.mktemp('yatube')
+
+
+@pytest.fixture(autouse=True)
+def isolated_files(settings, isolated_directory):
+    # кеш и метрики во временной папке, а не в проекте
+    for name, value in isolated_settings(str(isolated_directory)).items():
+        setattr(settings, name, value)
@@ -1,16 +1,29 @@
 from django.contrib import admin
 
+from django.db.models.expressions import RawSQL
+
 from .models import Group, Post, Follow, Comment
+from .search import fts_available, matching_ids_sql
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ("pk", "text", "pub_date", "author")
+    list_display = ("pk", "text", "pub_date", "author", "comments_count")
     # добавляем интерфейс для поиска по тексту постов
     search_fields = ("text",)
     # добавляем возможность фильтрации по дате
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # ищем по индексу FTS5, а не LIKE '%...%' по всей таблице
+        if not search_term or not fts_available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        ids_sql = matching_ids_sql(search_term)
+        if ids_sql is None:
+            return queryset.none(), False
+        return queryset.filter(id__in=RawSQL(*ids_sql)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
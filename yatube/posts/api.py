@@ -0,0 +1,235 @@
+"""
+JSON API только для чтения (/api/v1/): те же ленты, что и на сайте,
+отдельный пост с комментариями и лента подписок.
+
+Ленты и комментарии к посту (по COMMENTS_PER_PAGE) листаются курсором
+(?cursor=, как CursorPaginator на сайте), ?fields=id,text,... оставляет
+в карточках только нужные поля, ?limit= задает размер страницы. Общие
+для всех ответы лежат в кеше целиком, вместе с ETag: попадание в кеш не
+трогает базу. Правки и удаления постов меняют версию лент и сразу
+сбрасывают кеш, новые посты и комментарии появляются по истечении
+API_CACHE_TIMEOUT, как и фрагменты лент.
+"""
+import hashlib
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from . cache import feed_version
+from . models import Group, Post
+from . paginators import CursorPaginator
+from . views import comments_page
+
+User = get_user_model()
+
+# параметры, которые понимают ленты и пост; остальные не попадают
+# ни в ключ кеша, ни в ссылки на соседние страницы
+FEED_PARAMS = ('cursor', 'fields', 'limit')
+POST_PARAMS = ('cursor', 'fields')
+
+
+def _user(user):
+    return {'username': user.username, 'full_name': user.get_full_name()}
+
+
+# поля карточки поста: имя -> (связи для select_related, значение)
+POST_FIELDS = {
+    'id': ((), lambda post: post.pk),
+    'url': (('author',), lambda post: reverse('post', kwargs={
+        'username': post.author.username, 'post_id': post.pk})),
+    'text': ((), lambda post: post.text),
+    'pub_date': ((), lambda post: post.pub_date.isoformat()),
+    'author': (('author',), lambda post: _user(post.author)),
+    'group': (('group',), lambda post: post.group and {
+        'slug': post.group.slug, 'title': post.group.title}),
+    'image': ((), lambda post: post.image.url if post.image else None),
+    'comments_count': ((), lambda post: post.comments_count),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_view(view):
+    'Только GET/HEAD; ошибки, включая 404, - в JSON, а не страницей.'
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено'}, status=404)
+        except ApiError as error:
+            return JsonResponse({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def json_response(request, body, etag):
+    'Ответ с ETag; при совпадении If-None-Match - 304 без тела.'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def encode(data):
+    body = json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')).encode()
+    return body, quote_etag(hashlib.md5(body).hexdigest())
+
+
+def query_params(request, accepted):
+    'Параметры из accepted, которые есть в запросе, по порядку имен.'
+    return [(name, request.GET[name])
+            for name in sorted(accepted) if name in request.GET]
+
+
+def cursor_link(request, accepted, cursor):
+    'Ссылка на соседнюю страницу с тем же набором параметров.'
+    if cursor is None:
+        return None
+    query = dict(query_params(request, accepted), cursor=cursor)
+    return f'{request.path}?{urlencode(sorted(query.items()))}'
+
+
+def cached_json(request, build, accepted=FEED_PARAMS):
+    """
+    Ответ, одинаковый для всех зрителей, из общего кеша. build()
+    собирает данные, если в кеше их нет. Ключ - адрес и только
+    параметры из accepted: лишние (?utm_source=...) не плодят записи.
+    """
+    url = f'{request.path}?{urlencode(query_params(request, accepted))}'
+    path = hashlib.md5(url.encode()).hexdigest()
+    key = f'posts:api:{feed_version()}:{path}'
+    cached = cache.get(key)
+    if cached is None:
+        cached = encode(build())
+        cache.set(key, cached, settings.API_CACHE_TIMEOUT)
+    return json_response(request, *cached)
+
+
+def requested_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown or not fields:
+        raise ApiError(400, 'Неизвестные поля: ' + ', '.join(unknown)
+                       + '. Доступны: ' + ', '.join(POST_FIELDS))
+    return fields
+
+
+def for_fields(queryset, fields):
+    'JOIN только тех связей, которые нужны выбранным полям.'
+    related = {name for field in fields for name in POST_FIELDS[field][0]}
+    if related:
+        return queryset.select_related(*sorted(related))
+    return queryset
+
+
+def serialize_post(post, fields):
+    return {name: POST_FIELDS[name][1](post) for name in fields}
+
+
+def page_size(request):
+    raw = request.GET.get('limit')
+    if raw is None:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    if limit < 1:
+        raise ApiError(400, 'limit должен быть больше нуля')
+    return min(limit, settings.API_MAX_PAGE_SIZE)
+
+
+def feed_page(request, posts, ordering=('-pub_date', '-id')):
+    'Страница ленты по курсору: карточки и ссылки на соседние страницы.'
+    fields = requested_fields(request)
+    paginator = CursorPaginator(
+        for_fields(posts, fields), page_size(request), ordering)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize_post(post, fields) for post in page],
+        'next': cursor_link(request, FEED_PARAMS, page.next_cursor),
+        'previous': cursor_link(request, FEED_PARAMS, page.previous_cursor),
+    }
+
+
+@api_view
+def posts(request):
+    'Главная лента.'
+    return cached_json(request, lambda: feed_page(request, Post.objects.all()))
+
+
+@api_view
+def group_posts(request, slug):
+    'Лента группы.'
+    def build():
+        group = get_object_or_404(Group, slug=slug)
+        data = feed_page(request, group.posts.all())
+        data['group'] = {'slug': group.slug, 'title': group.title,
+                         'description': group.description}
+        return data
+    return cached_json(request, build)
+
+
+@api_view
+def profile_posts(request, username):
+    'Лента автора.'
+    def build():
+        author = get_object_or_404(User, username=username)
+        data = feed_page(request, author.posts.all())
+        data['author'] = _user(author)
+        return data
+    return cached_json(request, build)
+
+
+@api_view
+def post_detail(request, post_id):
+    'Пост и страница комментариев по курсору, как на странице поста.'
+    def build():
+        fields = requested_fields(request)
+        post = get_object_or_404(
+            for_fields(Post.objects.all(), fields), pk=post_id)
+        comments = comments_page(request, post)
+        data = serialize_post(post, fields)
+        data['comments'] = [{
+            'id': comment.pk,
+            'author': _user(comment.author),
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+        } for comment in comments]
+        data['comments_next'] = cursor_link(
+            request, POST_PARAMS, comments.next_cursor)
+        data['comments_previous'] = cursor_link(
+            request, POST_PARAMS, comments.previous_cursor)
+        return data
+    return cached_json(request, build, POST_PARAMS)
+
+
+@api_view
+def follow_posts(request):
+    'Лента подписок; у каждого своя, поэтому мимо кеша.'
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти на сайт')
+    posts = Post.objects.timeline(request.user)
+    data = feed_page(request, posts, Post.TIMELINE_ORDERING)
+    return json_response(request, *encode(data))
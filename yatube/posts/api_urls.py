@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path('posts/', api.posts, name='api_posts'),
+    path('posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path('follow/', api.follow_posts, name='api_follow'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='api_group'),
+    path('users/<str:username>/posts/', api.profile_posts,
+         name='api_profile'),
+]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # подключаем обработчики сигналов (лента подписок)
+        from . import signals  # noqa: F401
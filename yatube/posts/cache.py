@@ -0,0 +1,197 @@
+import hashlib
+import math
+import random
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from yatube.routers import current_replica
+
+from . models import Post
+
+FEED_VERSION_KEY = 'posts:feed-version'
+# как часто ждущий запрос проверяет, не готово ли значение, секунды
+CACHE_LOCK_POLL = 0.05
+
+
+def get_version(key):
+    # если ключ версии вытеснен, новая версия не совпадет со старыми
+    return cache.get_or_set(key, lambda: int(time.time() * 1000), None)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def feed_version():
+    'Текущая версия кеша лент: входит в ключ каждого фрагмента.'
+    return get_version(FEED_VERSION_KEY)
+
+
+def bump_feed_version():
+    'Сбрасывает все закешированные фрагменты лент и страницы гостей разом.'
+    bump_version(FEED_VERSION_KEY)
+
+
+def version_key(kind, value):
+    return f'posts:version:{kind}:{value}'
+
+
+def get_versions(objects):
+    """
+    Версии объектов [(вид, значение), ...] одним обращением к кешу.
+
+    Виды: post - пост, author - карточка автора (имя и счетчики),
+    profile и group - списки постов автора и группы, follow - подписки
+    пользователя.
+    """
+    keys = [version_key(kind, value) for kind, value in objects]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else get_version(key) for key in keys]
+
+
+def bump_versions(objects):
+    for kind, value in set(objects):
+        bump_version(version_key(kind, value))
+
+
+def post_objects(post_ids):
+    'Страницы, на которых видны посты: сами посты, профили и группы.'
+    rows = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'author__username', 'group__slug')
+    for pk, username, slug in rows:
+        yield 'post', pk
+        yield 'profile', username
+        if slug is not None:
+            yield 'group', slug
+
+
+def bump_post_versions(post_ids):
+    bump_versions(post_objects(post_ids))
+
+
+def get_or_compute(key, compute, timeout):
+    """
+    Значение из кеша или compute(), но без толпы пересчетов (stampede),
+    когда значение истекает под нагрузкой.
+
+    - Значение хранится CACHE_STALE_TIMEOUT секунд сверх timeout. Пока
+      один запрос под блокировкой считает новое, остальные получают
+      старое (stale-while-revalidate) и базу не трогают.
+    - Если значения нет совсем, остальные ждут считающего (single-flight)
+      не дольше CACHE_LOCK_TIMEOUT секунд.
+    - Незадолго до истечения значение с некоторой вероятностью
+      пересчитывается заранее (XFetch, Vattani et al.): тем раньше, чем
+      дольше пересчет, так что обычно толпа не возникает вовсе.
+
+    В кеше лежит (значение, момент истечения, время пересчета).
+    """
+    entry = cache.get(key)
+    if entry is not None and is_fresh(entry):
+        return entry[0]
+    if not settings.CACHE_STAMPEDE_PROTECTION:
+        return store_computed(key, compute, timeout)
+    lock_key = f'{key}:lock'
+    token = secrets.token_hex(8)
+    if cache.add(lock_key, token, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            return store_computed(key, compute, timeout)
+        finally:
+            release_lock(lock_key, token)
+    if entry is not None:
+        return entry[0]
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    # считающий запрос упал или завис
+    return compute()
+
+
+def release_lock(lock_key, token):
+    'Снимает блокировку, только если она все еще принадлежит запросу.'
+    # пересчет дольше CACHE_LOCK_TIMEOUT: блокировка истекла, и её уже
+    # мог взять другой запрос
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def is_fresh(entry):
+    'Можно ли отдать значение из кеша, не пересчитывая.'
+    _, expires, delta = entry
+    now = time.time()
+    if not settings.CACHE_STAMPEDE_PROTECTION:
+        return now < expires
+    # -log(u) > 0: значение считается истекшим на случайный запас
+    # раньше; 1 - random() не бывает нулем
+    return now - delta * settings.CACHE_EARLY_BETA * math.log(
+        1 - random.random()) < expires
+
+
+def store_computed(key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    if timeout is None:
+        cache.set(key, (value, math.inf, delta), None)
+    else:
+        cache.set(key, (value, time.time() + timeout, delta),
+                  timeout + settings.CACHE_STALE_TIMEOUT)
+    return value
+
+
+def feed_cache_context(request, feed, page, objects=()):
+    """
+    Ключ фрагмента ленты для {% fragment_cache %} и зритель для карточек.
+
+    Ключ зависит от ленты, страницы (номер или её посты), базы, из которой
+    она прочитана, валидаторов ленты из get_page() (дата последнего поста
+    и число постов), версий постов страницы и объектов objects и роли
+    зрителя. Роль важна только для ссылки "Редактировать": если среди
+    авторов страницы нет зрителя, он получает общий фрагмент вместе с
+    гостями. Тот же ключ служит валидатором ETag.
+
+    Валидаторы и версии читаются заново в каждом запросе, поэтому новый
+    пост, комментарий или правка сразу меняют ключ и ETag.
+    """
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if page.number is not None:
+        position = page.number
+    else:
+        # страница по курсору: в ключе её первый и последний пост, а не
+        # строка из адреса - иначе любой ?cursor= плодил бы записи кеша
+        position = f'{page[0].pk}-{page[-1].pk}'
+    total = None if getattr(page, 'is_cursor', False) else (
+        page.paginator.count)
+    latest = page.latest.timestamp() if page.latest else None
+    # страница из отстающей реплики кешируется отдельно: иначе
+    # пользователь после своей записи получил бы её из кеша
+    source = current_replica() or 'default'
+    base = f'{feed_version()}:{source}:{feed}:{position}:{total}:{latest}'
+    # посты и авторы страницы кешируются рядом с фрагментом, чтобы при
+    # попадании в кеш не выбирать посты из базы. При тех же валидаторах
+    # страница не меняется: правки и удаления меняют версию лент
+    state = get_or_compute(f'posts:feed-state:{base}', lambda: {
+        'authors': {post.author_id for post in page},
+        'posts': [post.pk for post in page],
+    }, timeout)
+    versions = get_versions(
+        [('post', pk) for pk in state['posts']] + list(objects))
+    token = hashlib.md5(repr(versions).encode()).hexdigest()[:16]
+    user = request.user
+    if user.is_authenticated and user.pk in state['authors']:
+        viewer = user
+    else:
+        viewer = None
+    return {
+        'feed_cache_key': (f'{base}:{token}:'
+                           f'{viewer.pk if viewer else "all"}'),
+        'feed_cache_timeout': timeout,
+        'feed_viewer': viewer,
+    }
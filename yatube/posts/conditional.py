@@ -0,0 +1,93 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from . cache import feed_version, get_versions
+
+
+def make_etag(request, validators):
+    'ETag страницы: валидаторы данных и зритель (от него зависит шапка).'
+    user = request.user
+    parts = (user.pk if user.is_authenticated else None, *validators)
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def render_conditional(request, template_name, context, validators):
+    """
+    Как render(), но если у клиента уже есть страница с теми же
+    валидаторами (If-None-Match), отвечает 304 без шаблона и миниатюр.
+    """
+    etag = make_etag(request, validators)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, template_name, context)
+    response['ETag'] = etag
+    return response
+
+
+def is_guest(request):
+    'Гость ли это, без запросов к базе, если нет cookie сессии.'
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    # сессия и пользователь - из кеша (users/middleware.py)
+    return not request.user.is_authenticated
+
+
+def cache_guest_page(**kinds):
+    """
+    Страница для гостей целиком из кеша, без view и базы.
+
+    Всё, что зависит от зрителя (шапка, вкладки, подписка, форма
+    комментария с csrf_token), у гостя одинаково, поэтому все гости
+    получают одну страницу. Ключ - адрес, версия лент и версии
+    объектов страницы: kinds сопоставляет виду объекта (posts/cache.py)
+    аргумент адреса, например post='post_id'. Сигналы меняют версии
+    только затронутых объектов, а страница живет не дольше
+    PAGE_CACHE_TIMEOUT секунд. Vary: Cookie не дает кешам браузера и
+    прокси отдать её вошедшему пользователю.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or not is_guest(request)):
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ('Cookie',))
+                return response
+            response = cached_page(
+                request, page_key(request, kinds, kwargs),
+                lambda: view(request, *args, **kwargs))
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def page_key(request, kinds, kwargs):
+    versions = get_versions(
+        (kind, kwargs[argument]) for kind, argument in kinds.items())
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return ':'.join(map(str, ('posts:page', feed_version(), *versions, path)))
+
+
+def cached_page(request, key, view):
+    cached = cache.get(key)
+    if cached is None:
+        response = view()
+        if response.status_code == 200:
+            cache.set(key, (
+                response.content, response['Content-Type'], response['ETag'],
+            ), settings.PAGE_CACHE_TIMEOUT)
+        return response
+    content, content_type, etag = cached
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,41 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . models import Follow, Post, UserCounters
+
+
+def count_actual(user_id):
+    'Честно пересчитывает счетчики пользователя через COUNT(*).'
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+    }
+
+
+def get_counters(user):
+    """
+    Счетчики для карточки автора: один запрос по первичному ключу
+    или ни одного, если они выбраны через select_related('counters').
+
+    Строку не создает: GET-запрос не должен писать в базу. Если строки
+    нет (ее удалили, а reconcile_counters еще не запускали), счетчики
+    считаются через COUNT(*) без сохранения.
+    """
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        return UserCounters(user_id=user.pk, **count_actual(user.pk))
+
+
+def change(user_id, field, delta):
+    'Атомарно меняет счетчик; отсутствующую строку не создает.'
+    UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+
+
+def count_subquery(queryset, field):
+    'COUNT(*) связанных строк коррелированным подзапросом.'
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
@@ -0,0 +1,183 @@
+"""
+Потоковое чтение и запись набора данных сайта для export_posts/import_posts.
+
+Каждая запись - объект в формате сериализатора Django, как в dump.json:
+{"model": "posts.post", "pk": 1, "fields": {...}}. Записи идут по одной на
+строку (JSON Lines) или массивом JSON, как у dumpdata; файл *.gz сжимается.
+"""
+import datetime
+import gzip
+import io
+import itertools
+import json
+import sys
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from . cache import bump_feed_version
+from . counters import count_subquery
+from . models import Comment, Post
+
+# порядок важен: сначала те, на кого ссылаются внешние ключи.
+# Timeline, UserCounters и comments_count вычисляются после импорта
+DATASET_MODELS = (
+    'auth.user', 'posts.group', 'posts.post', 'posts.comment', 'posts.follow',
+)
+
+READ_CHUNK = 64 * 1024
+
+
+def dataset_models():
+    return [apps.get_model(label) for label in DATASET_MODELS]
+
+
+@contextmanager
+def raw_dates(models):
+    'bulk_create() ставит в auto_now_add текущее время; берем даты из данных.'
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def reset_sequences(models):
+    # после вставки с явными pk последовательности PostgreSQL отстают
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def recount_comments(chunk_size):
+    'Пересчитывает Post.comments_count пачками по первичному ключу.'
+    posts = Post.objects.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            ids = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not ids:
+                return
+            last_pk = ids[-1]
+            Post.objects.filter(pk__in=ids).update(
+                comments_count=count_subquery(Comment.objects, 'post'))
+
+
+def rebuild_derived(chunk_size, stdout):
+    'bulk_create() не шлет сигналы: пересчитываем то, что они ведут.'
+    recount_comments(chunk_size)
+    stdout.write('Пересчитаны комментарии постов')
+    call_command('reconcile_counters', batch_size=chunk_size, stdout=stdout)
+    call_command('rebuild_timelines', batch_size=chunk_size, stdout=stdout)
+    bump_feed_version()
+
+
+def open_dataset(path, mode):
+    'Файл набора данных в текстовом режиме; "-" - stdin/stdout.'
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_model_records(model, chunk_size):
+    'Записи одной модели пачками по первичному ключу, без OFFSET.'
+    queryset = model._default_manager.order_by('pk')
+    m2m = [field.name for field in model._meta.many_to_many]
+    if m2m:
+        queryset = queryset.prefetch_related(*m2m)
+    last_pk = None
+    while True:
+        batch = queryset
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:chunk_size])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        yield serializers.serialize('python', batch)
+
+
+class DatasetEncoder(DjangoJSONEncoder):
+    'Как у dumpdata, но время с микросекундами, а не миллисекундами.'
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            value = o.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return super().default(o)
+
+
+class RecordWriter:
+    'Пишет записи как JSON Lines или как массив JSON (для loaddata).'
+
+    def __init__(self, stream, array=False):
+        self.stream = stream
+        self.array = array
+        self.written = 0
+
+    def __enter__(self):
+        if self.array:
+            self.stream.write('[')
+        return self
+
+    def write(self, record):
+        line = json.dumps(record, cls=DatasetEncoder, ensure_ascii=False)
+        if self.array:
+            self.stream.write(',\n' if self.written else '\n')
+            self.stream.write(line)
+        else:
+            self.stream.write(line + '\n')
+        self.written += 1
+
+    def __exit__(self, *exc_info):
+        if self.array:
+            self.stream.write('\n]\n')
+
+
+def iter_records(stream):
+    'Записи из JSON Lines или из массива JSON, не читая файл целиком.'
+    head = stream.read(READ_CHUNK)
+    if head.lstrip().startswith('['):
+        return _iter_array(stream, head.lstrip()[1:])
+    # дочитываем разорванную на границе куска строку
+    head += stream.readline()
+    lines = itertools.chain(io.StringIO(head), stream)
+    return (json.loads(line) for line in lines if line.strip())
+
+
+def _iter_array(stream, buffer):
+    decoder = json.JSONDecoder()
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise ValueError('Файл набора данных оборван или испорчен')
+            chunk = stream.read(READ_CHUNK)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
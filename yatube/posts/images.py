@@ -0,0 +1,73 @@
+"""
+Картинки постов перекодируются при сохранении: не больше IMAGE_MAX_SIZE
+по длинной стороне, без EXIF (поворот из него применяется к пикселям),
+progressive JPEG или WebP (IMAGE_FORMAT). Снимок с камеры на несколько
+мегабайт превращается в файл в сотни килобайт, и миниатюрам
+(posts/thumbnails.py) не приходится каждый раз декодировать оригинал.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# GIF сохраняем как есть: при перекодировании пропала бы анимация
+KEEP_FORMATS = {'GIF'}
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def has_alpha(image):
+    return (image.mode in ('RGBA', 'LA', 'PA')
+            or (image.mode == 'P' and 'transparency' in image.info))
+
+
+def save_options(image_format, image):
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if image_format == 'JPEG':
+        options.update(quality=settings.IMAGE_QUALITY, optimize=True,
+                       progressive=True)
+    elif image_format == 'WEBP':
+        options.update(quality=settings.IMAGE_QUALITY, method=4)
+    else:
+        options.update(optimize=True)
+    return options
+
+
+def normalize_image(file):
+    """
+    Перекодированная картинка (ContentFile с новым расширением) или None,
+    если файл нужно сохранить как есть.
+    """
+    limit = settings.IMAGE_MAX_SIZE
+    file.seek(0)
+    try:
+        image = Image.open(file)
+        if image.format in KEEP_FORMATS:
+            return None
+        # JPEG сразу декодируется в уменьшенном масштабе (1/2, 1/4, 1/8),
+        # но не меньше limit: большой снимок не разворачивается целиком
+        image.draft('RGB', (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # не картинка: пусть разбирается валидация поля
+        return None
+    finally:
+        file.seek(0)
+    image_format = settings.IMAGE_FORMAT
+    if image_format == 'JPEG' and has_alpha(image):
+        # прозрачность JPEG не хранит
+        image_format = 'PNG'
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+    output = BytesIO()
+    # info нового кадра не передается в save(): EXIF и прочие
+    # метаданные не сохраняются, кроме цветового профиля
+    image.save(output, image_format, **save_options(image_format, image))
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    return ContentFile(
+        output.getvalue(), name=f'{stem}.{EXTENSIONS[image_format]}')
@@ -0,0 +1,122 @@
+"""
+KV store sorl-thumbnail в три уровня: память процесса, общий кеш, база.
+
+Штатный cached_db ходит в общий кеш (у нас - файл SQLite) за каждой
+миниатюрой каждой карточки. Здесь готовые миниатюры еще и запоминаются
+в процессе на THUMBNAIL_LOCAL_CACHE_TIMEOUT секунд, а get_many() находит
+миниатюры всей страницы ленты одним get_many() кеша и одним запросом
+к базе (см. {% prefetch_page_thumbnails %}).
+
+В памяти хранятся только найденные миниатюры: "еще не готова" всегда
+спрашивается у общего кеша, иначе процесс не увидел бы миниатюру,
+созданную другим воркером.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class LocalTier:
+    'Ограниченный LRU-словарь процесса с временем жизни записей.'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = OrderedDict()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.values.get(key)
+                if entry is None:
+                    continue
+                value, expires = entry
+                if expires < now:
+                    del self.values[key]
+                    continue
+                self.values.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, values):
+        expires = time.monotonic() + settings.THUMBNAIL_LOCAL_CACHE_TIMEOUT
+        limit = settings.THUMBNAIL_LOCAL_CACHE_SIZE
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] = (value, expires)
+                self.values.move_to_end(key)
+            while len(self.values) > limit:
+                self.values.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.values.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class TieredKVStore(KVStore):
+    'cached_db KVStore с памятью процесса перед кешем и поиском пачкой.'
+
+    local = LocalTier()
+
+    def get_many_raw(self, keys):
+        'Сырые значения ключей (с префиксами), None - нет в хранилище.'
+        found = self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.cache.get_many(missing)
+            absent = [key for key in missing if key not in shared]
+            if absent:
+                rows = dict(KVStoreModel.objects.filter(
+                    key__in=absent).values_list('key', 'value'))
+                # как и cached_db, запоминаем в кеше и отсутствие
+                loaded = {key: rows.get(key, EMPTY_VALUE) for key in absent}
+                self.cache.set_many(
+                    loaded, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+                shared.update(loaded)
+            self.local.set_many({
+                key: value for key, value in shared.items()
+                if value != EMPTY_VALUE})
+            found.update(shared)
+        return {
+            key: None if found.get(key, EMPTY_VALUE) == EMPTY_VALUE
+            else found[key]
+            for key in keys
+        }
+
+    def get_many(self, image_files):
+        'Ключ ImageFile -> сохраненный ImageFile или None, одним проходом.'
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        raw = self.get_many_raw(list(keys))
+        return {
+            keys[key]: deserialize_image_file(value) if value else None
+            for key, value in raw.items()
+        }
+
+    def _get_raw(self, key):
+        return self.get_many_raw([key])[key]
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.local.set_many({key: value})
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self.local.delete_many(keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.local.clear()
@@ -0,0 +1,158 @@
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import (
+    Command as CreateCacheTable)
+from django.db import connections
+from django.utils.module_loading import import_string
+from yatube.workers import init_worker, use_database
+
+# DatabaseCache пишет в default: на время замера это пустая база
+# во временной папке, настоящая база не трогается
+DB_CACHE_TABLE = 'benchmark_cache'
+
+
+def backend_configs(directory):
+    return {
+        'locmem': ('django.core.cache.backends.locmem.LocMemCache',
+                   'benchmark'),
+        'file': ('django.core.cache.backends.filebased.FileBasedCache',
+                 os.path.join(directory, 'file')),
+        'db': ('django.core.cache.backends.db.DatabaseCache',
+               DB_CACHE_TABLE),
+        'sqlite': ('yatube.cache_backends.SQLiteCache',
+                   os.path.join(directory, 'cache.sqlite3')),
+    }
+
+
+def make_cache(config):
+    backend, location = config
+    # MAX_ENTRIES выше числа ключей, чтобы мерить работу, а не вытеснение
+    return import_string(backend)(location, {
+        'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': 1000000}})
+
+
+def timed(operation, keys):
+    started = time.perf_counter()
+    for key in keys:
+        operation(key)
+    return len(keys) / (time.perf_counter() - started)
+
+
+def mixed_worker(args):
+    'Чтение с заполнением при промахе, как у {% cache %}: (ops, hits, с).'
+    config, ops, key_space, value, seed = args
+    cache = make_cache(config)
+    rnd = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(ops):
+        key = f'fragment:{rnd.randrange(key_space)}'
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+    return ops, hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность бэкендов кеша: locmem, '
+            'файлового, DatabaseCache и общего SQLiteCache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=5000,
+                            help='Операций каждого вида на процесс.')
+        parser.add_argument('--value-size', type=int, default=4096,
+                            help='Размер значения в байтах (фрагмент HTML).')
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--keys', type=int, default=2000,
+                            help='Число разных ключей в смешанной нагрузке.')
+        parser.add_argument('--backends', nargs='+',
+                            default=['locmem', 'file', 'db', 'sqlite'])
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON.')
+
+    def handle(self, *args, **options):
+        value = 'x' * options['value_size']
+        original = connections['default']
+        original_config = connections.databases['default']
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                use_database(dict(
+                    copy.deepcopy(original_config),
+                    NAME=os.path.join(directory, 'db.sqlite3')))
+                create_table = CreateCacheTable()
+                create_table.verbosity = 0
+                create_table.create_table('default', DB_CACHE_TABLE, False)
+                configs = backend_configs(directory)
+                results = [
+                    self.measure(name, configs[name], value, options)
+                    for name in options['backends']
+                ]
+                connections['default'].close()
+        finally:
+            connections.databases['default'] = original_config
+            connections['default'] = original
+        report = {
+            'database': settings.DATABASES['default']['ENGINE'],
+            'value_size': options['value_size'],
+            'processes': options['processes'],
+            'results': results,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f'Значение {options["value_size"]} байт, '
+            f'{options["processes"]} процессов в смешанной нагрузке')
+        self.stdout.write(
+            f'{"бэкенд":<10}{"set/с":>10}{"get/с":>10}{"промах/с":>10}'
+            f'{"incr/с":>10}{"смеш./с":>10}{"попадания":>11}')
+        for row in results:
+            self.stdout.write(
+                f'{row["backend"]:<10}{row["set"]:>10.0f}{row["get"]:>10.0f}'
+                f'{row["miss"]:>10.0f}{row["incr"]:>10.0f}'
+                f'{row["mixed"]:>10.0f}{row["hit_rate"]:>10.1%}')
+
+    def measure(self, name, config, value, options):
+        cache = make_cache(config)
+        cache.clear()
+        keys = [f'key:{number}' for number in range(options['ops'])]
+        result = {
+            'backend': name,
+            'set': timed(lambda key: cache.set(key, value), keys),
+            'get': timed(cache.get, keys),
+            'miss': timed(cache.get, [f'missing:{key}' for key in keys]),
+        }
+        cache.set('counter', 0)
+        result['incr'] = timed(
+            lambda key: cache.incr('counter'), keys)
+        cache.clear()
+        # каждый процесс открывает кеш сам; у locmem кеш свой в процессе,
+        # поэтому попаданий меньше: соседи не видят прогретых ключей
+        connections.close_all()
+        jobs = [
+            (config, options['ops'], options['keys'], value, seed)
+            for seed in range(options['processes'])
+        ]
+        # контекст по умолчанию (на Windows - spawn): временную базу для
+        # DatabaseCache процесс получает от init_worker
+        with Pool(options['processes'], initializer=init_worker,
+                  initargs=(connections.databases['default'],)) as pool:
+            done = pool.map(mixed_worker, jobs)
+        ops = sum(row[0] for row in done)
+        result['mixed'] = ops / max(row[2] for row in done)
+        result['hit_rate'] = sum(row[1] for row in done) / ops
+        cache.clear()
+        return {
+            key: round(value, 3) if isinstance(value, float) else value
+            for key, value in result.items()
+        }
@@ -0,0 +1,135 @@
+import importlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import fts_query
+
+# DDL индекса берем прямо из миграции, чтобы мерить то же, что в проекте
+fts_migration = importlib.import_module('posts.migrations.0013_post_fts')
+
+
+def make_vocabulary(size, rnd):
+    letters = 'абвгдежзиклмнопрстуфхцчшэюя'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choice(letters)
+                          for _ in range(rnd.randint(4, 10))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по индексу FTS5 с LIKE на синтетической '
+            'таблице постов (в отдельной временной базе).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON.')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        vocabulary = make_vocabulary(20000, rnd)
+        # частоты слов по закону Ципфа, как в живых текстах
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)))
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            started = time.perf_counter()
+            self.fill(db, options['posts'], vocabulary, weights, rnd)
+            fill_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            for statement in fts_migration.FORWARD_SQL:
+                db.execute(statement)
+            db.commit()
+            index_seconds = time.perf_counter() - started
+            queries = {
+                'частое слово': vocabulary[0],
+                'среднее слово': vocabulary[200],
+                'редкое слово': vocabulary[15000],
+                'два слова': f'{vocabulary[3]} {vocabulary[50]}',
+            }
+            results = [
+                self.measure(db, label, text, options['repeat'])
+                for label, text in queries.items()
+            ]
+            db.close()
+        report = {
+            'posts': options['posts'],
+            'fill_seconds': round(fill_seconds, 2),
+            'index_seconds': round(index_seconds, 2),
+            'queries': results,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        self.stdout.write(
+            f'Постов: {report["posts"]}, заполнение: {fill_seconds:.1f} с, '
+            f'построение индекса: {index_seconds:.1f} с')
+        self.stdout.write(
+            f'{"запрос":<16}{"найдено":>10}{"LIKE стр.":>12}'
+            f'{"FTS стр.":>12}{"LIKE всего":>12}{"FTS всего":>12}  (мс)')
+        for row in results:
+            self.stdout.write(
+                f'{row["label"]:<16}{row["found"]:>10}'
+                f'{row["like_page_ms"]:>12.2f}{row["fts_page_ms"]:>12.2f}'
+                f'{row["like_count_ms"]:>12.2f}{row["fts_count_ms"]:>12.2f}')
+
+    def fill(self, db, total, vocabulary, weights, rnd):
+        db.execute('CREATE TABLE posts_post '
+                   '(id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+        batch = 10000
+        for start in range(0, total, batch):
+            rows = [
+                (' '.join(rnd.choices(vocabulary, cum_weights=weights,
+                                      k=rnd.randint(10, 40))),)
+                for _ in range(min(batch, total - start))
+            ]
+            db.executemany('INSERT INTO posts_post (text) VALUES (?)', rows)
+        db.commit()
+
+    def timed(self, db, sql, params, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = db.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), result
+
+    def measure(self, db, label, text, repeat):
+        words = text.split()
+        # так ищет админка: LIKE по каждому слову, новые посты первыми
+        like_where = ' AND '.join('text LIKE ?' for _ in words)
+        like_params = [f'%{word}%' for word in words]
+        match = fts_query(text)
+        like_page_ms, _ = self.timed(
+            db, f'SELECT id FROM posts_post WHERE {like_where} '
+                'ORDER BY id DESC LIMIT 10', like_params, repeat)
+        fts_page_ms, _ = self.timed(
+            db, 'SELECT rowid FROM posts_post_fts WHERE posts_post_fts '
+                'MATCH ? ORDER BY bm25(posts_post_fts) LIMIT 10',
+            [match], repeat)
+        like_count_ms, _ = self.timed(
+            db, f'SELECT COUNT(*) FROM posts_post WHERE {like_where}',
+            like_params, repeat)
+        fts_count_ms, found = self.timed(
+            db, 'SELECT COUNT(*) FROM posts_post_fts WHERE posts_post_fts '
+                'MATCH ?', [match], repeat)
+        return {
+            'label': label,
+            'query': text,
+            'found': found[0][0],
+            'like_page_ms': round(like_page_ms, 3),
+            'fts_page_ms': round(fts_page_ms, 3),
+            'like_count_ms': round(like_count_ms, 3),
+            'fts_count_ms': round(fts_count_ms, 3),
+        }
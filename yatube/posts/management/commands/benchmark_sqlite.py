@@ -0,0 +1,224 @@
+import copy
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    OperationalError, close_old_connections, connections, transaction)
+from django.test import override_settings
+
+from posts.models import Comment, Follow, Post
+from yatube.runner import isolated_settings
+from yatube.workers import init_worker, use_database
+
+from .benchmark_urls import percentile
+
+# штатный бэкенд: журнал DELETE, соединение на каждый запрос
+STOCK = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {},
+}
+
+
+def profiles():
+    'Имя -> (настройки базы без NAME, journal_mode файла перед замером).'
+    tuned = copy.deepcopy(settings.DATABASES['default'])
+    tuned.pop('NAME')
+    return {
+        'stock': (STOCK, 'DELETE'),
+        'tuned': (tuned, 'WAL'),
+    }
+
+
+def copy_database(source, path, journal_mode=None):
+    'Копирует базу соединения source в файл path через backup API.'
+    if source.in_atomic_block:
+        # backup API ждал бы конца транзакции вечно
+        raise CommandError('Нельзя копировать базу внутри транзакции')
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target)
+        if journal_mode:
+            target.execute(f'PRAGMA journal_mode = {journal_mode}')
+    finally:
+        target.close()
+
+
+def read(rnd, ids):
+    'Запросы страниц: лента, профиль, пост с комментариями.'
+    page = settings.POSTS_PER_PAGE
+    choice = rnd.random()
+    if choice < 0.4:
+        list(Post.objects.for_feed()[:page])
+    elif choice < 0.7:
+        list(Post.objects.for_feed().filter(
+            author_id=rnd.choice(ids['users']))[:page])
+    else:
+        post_id = rnd.choice(ids['posts'])
+        Post.objects.for_feed().filter(pk=post_id).first()
+        list(Comment.objects.filter(post_id=post_id).select_related(
+            'author').order_by('created', 'id')[:settings.COMMENTS_PER_PAGE])
+
+
+def write(rnd, ids):
+    'Запись, как у view: комментарий, пост или подписка с сигналами.'
+    user_id = rnd.choice(ids['users'])
+    choice = rnd.random()
+    with transaction.atomic():
+        if choice < 0.6:
+            Comment.objects.create(
+                post_id=rnd.choice(ids['posts']), author_id=user_id,
+                text='benchmark')
+        elif choice < 0.8:
+            Post.objects.create(author_id=user_id, text='benchmark')
+        else:
+            author_id = rnd.choice(ids['users'])
+            if author_id == user_id:
+                return
+            follow = Follow.objects.filter(
+                user_id=user_id, author_id=author_id).first()
+            if follow is None:
+                Follow.objects.create(user_id=user_id, author_id=author_id)
+            else:
+                follow.delete()
+
+
+def worker(args):
+    'Операции до истечения времени: (чтения, записи, ошибки, задержки).'
+    seconds, write_ratio, ids, seed = args
+    rnd = random.Random(seed)
+    reads = writes = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        is_write = rnd.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if is_write:
+                write(rnd, ids)
+            else:
+                read(rnd, ids)
+        except OperationalError:
+            # database is locked: view ответил бы 500
+            errors += 1
+        else:
+            if is_write:
+                writes += 1
+            else:
+                reads += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+        # конец запроса: CONN_MAX_AGE решает, закрыть ли соединение
+        close_old_connections()
+    connections.close_all()
+    return reads, writes, errors, latencies
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает штатный бэкенд SQLite с настроенным '
+            '(yatube/sqlite/base.py) под одновременными чтением и '
+            'записью нескольких процессов. Замер идет на копии базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--seconds', type=float, default=10,
+                            help='Длительность замера каждого профиля.')
+        parser.add_argument('--write-ratio', type=float, default=0.1,
+                            help='Доля операций записи.')
+        parser.add_argument('--profiles', nargs='+',
+                            default=['stock', 'tuned'])
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON.')
+
+    def handle(self, *args, **options):
+        ids = {
+            'users': list(Post.objects.order_by().values_list(
+                'author_id', flat=True).distinct()),
+            'posts': list(Post.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:10000]),
+        }
+        if not ids['posts']:
+            raise CommandError(
+                'Нет данных для замеров, сначала запустите generate_dataset')
+        configs = profiles()
+        original = connections['default']
+        original_config = connections.databases['default']
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                # сигналы записей меняют версии в кеше: не в кеше сайта
+                overrides = isolated_settings(directory)
+                with override_settings(**overrides):
+                    results = [
+                        self.measure(name, configs[name], ids, directory,
+                                     original, overrides, options)
+                        for name in options['profiles']
+                    ]
+        finally:
+            connections.databases['default'] = original_config
+            connections['default'] = original
+        report = {
+            'processes': options['processes'],
+            'seconds': options['seconds'],
+            'write_ratio': options['write_ratio'],
+            'posts': len(ids['posts']),
+            'results': results,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f'{options["processes"]} процессов по {options["seconds"]} с, '
+            f'доля записи {options["write_ratio"]:.0%}')
+        self.stdout.write(
+            f'{"профиль":<9}{"опер./с":>10}{"чтен./с":>10}{"зап./с":>9}'
+            f'{"ошибки":>8}{"p50":>8}{"p99":>8}  (мс)')
+        for row in results:
+            self.stdout.write(
+                f'{row["profile"]:<9}{row["ops_per_s"]:>10.0f}'
+                f'{row["reads_per_s"]:>10.0f}{row["writes_per_s"]:>9.0f}'
+                f'{row["errors"]:>8}{row["p50_ms"]:>8.2f}'
+                f'{row["p99_ms"]:>8.2f}')
+
+    def measure(self, name, profile, ids, directory, original, overrides,
+                options):
+        config, journal_mode = profile
+        # у каждого профиля своя свежая копия: записи прошлого замера
+        # не влияют на следующий
+        path = os.path.join(directory, f'{name}.sqlite3')
+        copy_database(original, path, journal_mode)
+        database = dict(copy.deepcopy(config), NAME=path)
+        use_database(database)
+        jobs = [
+            (options['seconds'], options['write_ratio'], ids, seed)
+            for seed in range(options['processes'])
+        ]
+        # контекст по умолчанию: на Windows fork нет. Копию базы процесс
+        # получает от init_worker, а не наследует
+        with Pool(options['processes'], initializer=init_worker,
+                  initargs=(database, overrides)) as pool:
+            done = pool.map(worker, jobs)
+        connections['default'].close()
+        seconds = options['seconds']
+        reads = sum(row[0] for row in done)
+        writes = sum(row[1] for row in done)
+        latencies = [value for row in done for value in row[3]]
+        return {
+            'profile': name,
+            'engine': config['ENGINE'],
+            'ops_per_s': round((reads + writes) / seconds, 1),
+            'reads_per_s': round(reads / seconds, 1),
+            'writes_per_s': round(writes / seconds, 1),
+            'errors': sum(row[2] for row in done),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+        }
@@ -0,0 +1,159 @@
+import copy
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube.runner import isolated_settings
+from yatube.workers import use_database
+
+from .benchmark_sqlite import copy_database
+from .benchmark_urls import percentile
+
+User = get_user_model()
+
+MODES = {'plain': False, 'protected': True}
+
+# выборка постов страницы: её делает только пересчет фрагмента ленты,
+# остальные запросы (группа, число постов) есть в каждом ответе
+FEED_QUERY = 'SELECT "posts_post"."id"'
+
+
+def worker(cookies, url, deadline, start, results):
+    'Запросы ленты до deadline: (начало, выборок ленты, запросов, мс).'
+    client = Client()
+    client.cookies = copy.deepcopy(cookies)
+    start.wait()
+    rows = []
+    try:
+        while time.perf_counter() < deadline:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                client.get(url)
+                finished = time.perf_counter()
+            feed = sum(query['sql'].startswith(FEED_QUERY)
+                       for query in captured)
+            rows.append((started, feed, len(captured),
+                         (finished - started) * 1000))
+    finally:
+        connections.close_all()
+        results.extend(rows)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузка на ленту при истечении кеша фрагментов: сравнивает '
+            'обычный кеш (plain, как {% cache %}) с get_or_compute '
+            '(protected). Показывает всплески выборок ленты из базы по '
+            'интервалам времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--timeout', type=int, default=2,
+                            help='Время жизни фрагментов ленты, секунды.')
+        parser.add_argument('--bucket', type=float, default=0.1,
+                            help='Интервал для подсчета всплесков, секунды.')
+        parser.add_argument(
+            '--path', help='Адрес ленты (по умолчанию - главная).')
+        parser.add_argument('--modes', nargs='+', default=list(MODES),
+                            choices=list(MODES))
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(posts__isnull=False).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замеров, сначала запустите generate_dataset')
+        original = connections['default']
+        original_config = connections.databases['default']
+        try:
+            # копия базы (вход пишет сессию) и свой кеш: замер очищает
+            # кеш перед каждым режимом
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'db.sqlite3')
+                copy_database(original, path)
+                use_database(dict(copy.deepcopy(original_config), NAME=path))
+                with override_settings(**isolated_settings(directory)):
+                    # вошедший пользователь: гостю страница пришла бы из
+                    # кеша целиком
+                    results = [self.measure(mode, user, options)
+                               for mode in options['modes']]
+                connections['default'].close()
+        finally:
+            connections.databases['default'] = original_config
+            connections['default'] = original
+        report = {
+            'threads': options['threads'],
+            'seconds': options['seconds'],
+            'timeout': options['timeout'],
+            'bucket': options['bucket'],
+            'results': results,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f'{options["threads"]} клиентов, {options["seconds"]} с, '
+            f'фрагменты живут {options["timeout"]} с; пик - выборок ленты '
+            f'за {options["bucket"]} с')
+        self.stdout.write(
+            f'{"режим":<11}{"ответов":>9}{"запросов":>10}{"выборок":>9}'
+            f'{"пик":>6}{"p50":>9}{"p99":>9}{"max":>9}  (мс)')
+        for row in results:
+            self.stdout.write(
+                f'{row["mode"]:<11}{row["requests"]:>9}{row["queries"]:>10}'
+                f'{row["feed_queries"]:>9}{row["peak_feed_queries"]:>6}'
+                f'{row["p50_ms"]:>9.2f}{row["p99_ms"]:>9.2f}'
+                f'{row["max_ms"]:>9.2f}')
+
+    def measure(self, mode, user, options):
+        cache.clear()
+        url = options['path'] or reverse('index')
+        # одна сессия на всех: вход из потоков писал бы в базу одновременно
+        login = Client()
+        login.force_login(user)
+        results = []
+        start = threading.Event()
+        with override_settings(
+                CACHE_STAMPEDE_PROTECTION=MODES[mode],
+                FEED_CACHE_TIMEOUT=options['timeout']):
+            began = time.perf_counter()
+            deadline = began + options['seconds']
+            threads = [
+                threading.Thread(target=worker, args=(
+                    login.cookies, url, deadline, start, results))
+                for _ in range(options['threads'])
+            ]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+        buckets = Counter()
+        for started, feed, _, _ in results:
+            buckets[int((started - began) / options['bucket'])] += feed
+        timings = [row[3] for row in results]
+        return {
+            'mode': mode,
+            'requests': len(results),
+            'queries': sum(row[2] for row in results),
+            'feed_queries': sum(row[1] for row in results),
+            'peak_feed_queries': max(buckets.values()),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(max(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+        }
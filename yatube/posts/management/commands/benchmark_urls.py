@@ -0,0 +1,182 @@
+import json
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from about import urls as about_urls
+from posts import api_urls, urls as posts_urls
+from posts.models import Group, Post
+from yatube.runner import isolated_settings
+
+User = get_user_model()
+
+# GET на эти адреса меняет данные (подписка), их не замеряем
+MUTATING = {'profile_follow', 'profile_unfollow'}
+
+# гостям API отвечает 401, замеряем только с входом
+LOGIN_REQUIRED = {'api_follow'}
+
+# параметры запроса для адресов, которым без них нечего показать
+QUERY = {'search': {'q': 'the'}}
+
+
+def percentile(values, percent):
+    """
+    Процентиль с линейной интерполяцией между соседними значениями, как
+    statistics.quantiles(method='inclusive') (его нет в Python 3.7).
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет все адреса posts/urls.py, posts/api_urls.py и '
+            'about/urls.py через '
+            'тестовый клиент: p50/p95/p99 времени ответа, число запросов '
+            'к базе и размер страницы. Данные - generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument(
+            '--user', help='Пользователь для замеров с входом на сайт '
+                           '(по умолчанию - самый активный читатель).')
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='Замерить только адреса с этими именами.')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON.')
+        parser.add_argument('--output', help='Записать JSON в файл.')
+
+    def handle(self, *args, **options):
+        user = self.pick_user(options['user'])
+        kwargs = self.url_kwargs(user)
+        guest = Client()
+        member = Client()
+        member.force_login(user)
+        results = []
+        # свой кеш во временной папке: --cold очищает его, а не кеш сайта
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                **isolated_settings(directory)):
+            for name, url, query in self.routes(kwargs, options['only']):
+                for client_name, client in (('guest', guest),
+                                            ('user', member)):
+                    if client_name == 'guest' and name in LOGIN_REQUIRED:
+                        continue
+                    results.append(self.measure(
+                        name, url, query, client_name, client, options))
+        report = {
+            'database': settings.DATABASES['default']['ENGINE'],
+            'cache': settings.CACHES['default']['BACKEND'],
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+            'user': user.username,
+            'repeat': options['repeat'],
+            'cold': options['cold'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        self.stdout.write(
+            f'Постов: {report["posts"]}, пользователей: {report["users"]}, '
+            f'кеш {"очищается" if options["cold"] else "прогрет"}')
+        self.stdout.write(
+            f'{"адрес":<34}{"кто":<7}{"код":>5}{"p50":>9}{"p95":>9}'
+            f'{"p99":>9}{"запр.":>7}{"байт":>9}  (мс)')
+        for row in results:
+            self.stdout.write(
+                f'{row["url"][:33]:<34}{row["client"]:<7}{row["status"]:>5}'
+                f'{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}'
+                f'{row["p99_ms"]:>9.2f}{row["queries"]:>7}{row["bytes"]:>9}')
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}')
+        # с постами и подписками: у него не пусты ни профиль, ни лента
+        user = (
+            User.objects.filter(posts__isnull=False, follower__isnull=False)
+            .annotate(follows=Count('follower', distinct=True))
+            .order_by('-follows').first()
+        )
+        if user is None:
+            raise CommandError(
+                'Нет данных для замеров, сначала запустите generate_dataset')
+        return user
+
+    def url_kwargs(self, user):
+        post = user.posts.order_by('-comments_count', '-pk').first()
+        group = (Group.objects.filter(posts__isnull=False).first()
+                 or Group.objects.first())
+        return {
+            'username': user.username,
+            'post_id': post.pk,
+            'slug': group.slug if group else 'missing',
+        }
+
+    def routes(self, kwargs, only):
+        'Имя, адрес и параметры запроса каждого маршрута.'
+        modules = (('', posts_urls), ('', api_urls), ('about:', about_urls))
+        for namespace, module in modules:
+            for pattern in module.urlpatterns:
+                if not isinstance(pattern, URLPattern) or not pattern.name:
+                    continue
+                full_name = namespace + pattern.name
+                if full_name in MUTATING or (only and full_name not in only):
+                    continue
+                names = pattern.pattern.converters.keys()
+                if not names:
+                    # у path('<username>/...') без явного типа
+                    names = pattern.pattern.regex.groupindex.keys()
+                url = reverse(full_name, kwargs={
+                    name: kwargs[name] for name in names})
+                yield full_name, url, QUERY.get(full_name, {})
+
+    def measure(self, name, url, query, client_name, client, options):
+        for _ in range(options['warmup']):
+            client.get(url, query)
+        timings = []
+        queries = []
+        for _ in range(options['repeat']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url, query)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        return {
+            'name': name,
+            'url': url,
+            'client': client_name,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': max(queries),
+            'bytes': len(response.content),
+        }
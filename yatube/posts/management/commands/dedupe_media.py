@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.cache import bump_feed_version
+from posts.models import Post
+from posts.storage import is_hashed_name
+
+
+class Command(BaseCommand):
+    help = ('Переименовывает картинки постов по содержимому '
+            '(posts/storage.py): одинаковые файлы сливаются в один, '
+            'старые файлы и их миниатюры удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не меняя.')
+        parser.add_argument(
+            '--keep-files', action='store_true',
+            help='Не удалять старые файлы (например, их еще отдает CDN).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        dry_run = options['dry_run']
+        renamed = self.rename_files(dry_run)
+        if not renamed:
+            self.stdout.write('Все картинки уже названы по содержимому')
+            return
+        before = sum(size for _, size in renamed.values())
+        targets = {new: size for new, size in renamed.values()}
+        self.stdout.write(
+            f'Файлов: {len(renamed)}, различных: {len(targets)}, '
+            f'байт: {before} -> {sum(targets.values())}')
+        if dry_run:
+            return
+        updated = self.update_posts(
+            {old: new for old, (new, _) in renamed.items()},
+            options['batch_size'])
+        for old in renamed:
+            self.delete_old(old, options['keep_files'])
+        # в кеше лент остались ссылки на удаленные миниатюры
+        bump_feed_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено постов: {updated}. Миниатюры создаст '
+            f'generate_thumbnails или первый показ поста.'))
+
+    def rename_files(self, dry_run):
+        'Старое имя -> (имя по содержимому, размер) для каждого файла.'
+        storage = self.storage
+        names = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('image').values_list('image', flat=True).distinct()
+        )
+        renamed = {}
+        for name in names.iterator():
+            if is_hashed_name(name):
+                continue
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла {name}, пропускаю')
+                continue
+            with storage.open(name) as source:
+                # save() не создает второй файл с тем же содержимым
+                if dry_run:
+                    new = storage.hashed_name(name, source)
+                else:
+                    new = storage.save(name, source)
+            renamed[name] = (new, storage.size(name))
+        return renamed
+
+    def update_posts(self, names, batch_size):
+        'Один проход по постам, изменения - пачками bulk_update.'
+        posts = Post.objects.exclude(image='').exclude(
+            image__isnull=True).only('pk', 'image').order_by('pk')
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for post in batch:
+                new = names.get(post.image.name)
+                if new is not None:
+                    post.image = new
+                    changed.append(post)
+            if changed:
+                with transaction.atomic():
+                    Post.objects.bulk_update(changed, ['image'])
+                updated += len(changed)
+        return updated
+
+    def delete_old(self, name, keep_file):
+        # миниатюры старого имени больше никто не покажет; их создавали,
+        # когда картинки лежали в default_storage, он и входит в ключ
+        image = ImageFile(name)
+        default.kvstore.delete_thumbnails(image)
+        default.kvstore.delete(image)
+        if not keep_file:
+            self.storage.delete(name)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts.dataset import (RecordWriter, dataset_models, iter_model_records,
+                           open_dataset)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и подписки '
+            'в JSON Lines пачками, не держа всю базу в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл (*.gz - со сжатием) или "-" для stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--array', action='store_true',
+            help='Массив JSON, как у dumpdata (читается и loaddata).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        # при выгрузке в stdout прогресс уходит в stderr
+        progress = self.stderr if path == '-' else self.stdout
+        stream = open_dataset(path, 'w')
+        try:
+            with RecordWriter(stream, array=options['array']) as writer:
+                for model in dataset_models():
+                    label = model._meta.label_lower
+                    exported = 0
+                    for records in iter_model_records(
+                            model, options['chunk_size']):
+                        for record in records:
+                            writer.write(record)
+                        exported += len(records)
+                        progress.write(f'{label}: {exported}')
+        finally:
+            if path != '-':
+                stream.close()
+        progress.write(self.style.SUCCESS(
+            f'Выгружено записей: {writer.written}'))
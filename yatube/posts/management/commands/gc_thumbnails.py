@@ -0,0 +1,144 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts.models import Post
+from posts.storage import post_image_storage
+from posts.thumbnails import THUMBNAIL_SPECS, backend
+
+# имена нужных миниатюр живут в базе, а не в памяти процесса: на
+# миллионах постов множество имен заняло бы сотни мегабайт
+LIVE_TABLE = 'gc_live_thumbnails'
+CREATE_SQL = f'CREATE TEMPORARY TABLE {LIVE_TABLE} (name varchar(255))'
+INSERT_SQL = f'INSERT INTO {LIVE_TABLE} (name) VALUES (%s)'
+INDEX_SQL = f'CREATE INDEX {LIVE_TABLE}_name ON {LIVE_TABLE} (name)'
+COUNT_SQL = f'SELECT COUNT(DISTINCT name) FROM {LIVE_TABLE}'
+
+
+def walk_files(path, prune=False):
+    """
+    Файлы дерева по одному, без списка всего дерева в памяти.
+    prune удаляет опустевшие каталоги на обратном пути.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path, prune)
+                if not prune:
+                    continue
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    # в каталоге остались файлы
+                    pass
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из media/cache миниатюры, которые не показывает ни '
+            'один пост: картинки удаленных и измененных постов, старые '
+            'размеры из THUMBNAIL_SPECS, потерянные KV store файлы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя.')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд: их могли '
+                 'создать для поста, сохраненного после начала обхода.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        storage = default.storage
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        root = storage.path(prefix)
+        if not os.path.isdir(root):
+            self.stdout.write(f'Нет каталога {root}')
+            return
+        batch_size = options['batch_size']
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SQL)
+            try:
+                self.fill_live(cursor, batch_size)
+                # индекс после заполнения: вставка идет без его перестройки
+                cursor.execute(INDEX_SQL)
+                cursor.execute(COUNT_SQL)
+                self.stdout.write(f'Нужных миниатюр: {cursor.fetchone()[0]}')
+                self.collect(cursor, root, options)
+            finally:
+                cursor.execute(f'DROP TABLE {LIVE_TABLE}')
+
+    def collect(self, cursor, root, options):
+        storage = default.storage
+        newest = time.time() - options['min_age']
+        dry_run = options['dry_run']
+        self.removed = self.kept = self.freed = 0
+        batch = []
+        for entry in walk_files(root, prune=not dry_run):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > newest:
+                self.kept += 1
+                continue
+            name = os.path.relpath(entry.path, storage.path('')).replace(
+                os.sep, '/')
+            batch.append((name, entry.path, stat.st_size))
+            if len(batch) >= options['batch_size']:
+                self.remove_dead(cursor, batch, dry_run)
+                batch = []
+        if batch:
+            self.remove_dead(cursor, batch, dry_run)
+        action = 'Можно удалить' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: {self.removed} ({self.freed} байт), '
+            f'оставлено: {self.kept}'))
+
+    def remove_dead(self, cursor, batch, dry_run):
+        'Удаляет файлы пачки, которых нет среди нужных миниатюр.'
+        marks = ', '.join(['%s'] * len(batch))
+        cursor.execute(
+            f'SELECT name FROM {LIVE_TABLE} WHERE name IN ({marks})',
+            [name for name, _, _ in batch])
+        live = {row[0] for row in cursor.fetchall()}
+        keys = []
+        for name, path, size in batch:
+            if name in live:
+                self.kept += 1
+                continue
+            self.removed += 1
+            self.freed += size
+            if dry_run:
+                continue
+            os.remove(path)
+            keys.append(add_prefix(ImageFile(name, default.storage).key))
+        if keys:
+            # записи удаленных миниатюр - одним DELETE на пачку
+            default.kvstore._delete_raw(*keys)
+
+    def fill_live(self, cursor, batch_size):
+        """
+        Пишет во временную таблицу имена миниатюр всех THUMBNAIL_SPECS
+        для картинок постов: в памяти - не больше пачки имен.
+        """
+        names = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('image').values_list('image', flat=True).distinct()
+        )
+        rows = []
+        for name in names.iterator(chunk_size=batch_size):
+            source = ImageFile(name, post_image_storage)
+            for geometry, options in THUMBNAIL_SPECS.values():
+                rows.append([backend.thumbnail_file(
+                    source, geometry, **options).name])
+            if len(rows) >= batch_size:
+                cursor.executemany(INSERT_SQL, rows)
+                rows = []
+        if rows:
+            cursor.executemany(INSERT_SQL, rows)
@@ -0,0 +1,191 @@
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from mixer.backend.django import Mixer
+
+from posts.dataset import (dataset_models, raw_dates, rebuild_derived,
+                           reset_sequences)
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# пароль всех созданных пользователей - для входа при ручной проверке
+PASSWORD = 'benchmark'
+
+
+def zipf_weights(size, alpha):
+    'Накопленные веса закона Ципфа: первый в 2**alpha раз "весомее" второго.'
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, size + 1)))
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными для замеров: авторы и '
+            'подписки распределены по степенному закону, как в живых '
+            'соцсетях (немногие пишут много и собирают всех подписчиков).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов.')
+        parser.add_argument(
+            '--activity-alpha', type=float, default=0.8,
+            help='Показатель закона Ципфа для числа постов автора.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.mixer = Mixer(commit=False)
+        self.mixer.faker.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        # тексты постов и комментариев - из набора, заранее созданного faker:
+        # mixer на каждый из миллионов постов слишком медленный
+        self.texts = [self.mixer.faker.text() for _ in range(5000)]
+        self.phrases = [self.mixer.faker.sentence() for _ in range(2000)]
+
+        with raw_dates(dataset_models()):
+            users = self.create_users(options['users'])
+            groups = self.create_groups(options['groups'])
+            # популярность и активность автора - его места в двух
+            # случайных порядках: много пишут не обязательно самые читаемые,
+            # иначе один автор собирает и посты, и всех подписчиков
+            self.create_follows(
+                users, *self.ranking(users, options['alpha']),
+                options['follows'])
+            first_post, dates = self.create_posts(
+                options['posts'],
+                *self.ranking(users, options['activity_alpha']),
+                groups, options['days'])
+            self.create_comments(
+                options['comments'], users, first_post, dates)
+        reset_sequences(dataset_models())
+        rebuild_derived(self.batch_size, self.stdout)
+        # после массовой вставки планировщику нужна свежая статистика
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def ranking(self, users, alpha):
+        'Пользователи в случайном порядке и накопленные веса их мест.'
+        ranked = users[:]
+        self.rnd.shuffle(ranked)
+        return ranked, zipf_weights(len(ranked), alpha)
+
+    def save(self, model, objects, label):
+        'Сохраняет объекты пачками, каждую в своей транзакции.'
+        saved = 0
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            saved += len(batch)
+            self.stdout.write(f'{label}: {saved}')
+
+    def create_users(self, total):
+        password = make_password(PASSWORD)
+        start = next_pk(User)
+        mixer = self.mixer
+        self.save(User, (
+            mixer.blend(User, pk=start + number, password=password,
+                        username=f'{mixer.faker.user_name()}{start + number}',
+                        is_active=True, is_staff=False, is_superuser=False)
+            for number in range(total)
+        ), 'Пользователи')
+        return list(range(start, start + total))
+
+    def create_groups(self, total):
+        start = next_pk(Group)
+        mixer = self.mixer
+        self.save(Group, (
+            mixer.blend(Group, pk=start + number,
+                        slug=f'group-{start + number}',
+                        title=mixer.faker.sentence(nb_words=3)[:200])
+            for number in range(total)
+        ), 'Группы')
+        return list(range(start, start + total))
+
+    def create_follows(self, users, authors, weights, mean):
+        rnd = self.rnd
+        # число подписок тоже по степенному закону (Парето, среднее = mean)
+        scale = mean / 2
+
+        def follows():
+            for user in users:
+                count = min(int(scale * rnd.paretovariate(2)),
+                            len(authors) - 1)
+                chosen = set(rnd.choices(authors, cum_weights=weights,
+                                         k=count))
+                chosen.discard(user)
+                for author in chosen:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.save(Follow, follows(), 'Подписки')
+
+    def create_posts(self, total, authors, weights, groups, days):
+        'Посты по возрастанию даты; возвращает первый pk и функцию даты.'
+        rnd = self.rnd
+        start = next_pk(Post)
+        now = timezone.now()
+        began = now - timedelta(days=days)
+        step = (now - began) / max(total, 1)
+
+        def date(number):
+            return began + step * number
+
+        def posts():
+            for number in range(total):
+                group = None
+                if groups and rnd.random() < 0.5:
+                    group = rnd.choice(groups)
+                yield Post(
+                    pk=start + number, text=rnd.choice(self.texts),
+                    author_id=rnd.choices(authors, cum_weights=weights)[0],
+                    group_id=group, pub_date=date(number), image='')
+
+        self.save(Post, posts(), 'Посты')
+        return start, date
+
+    def create_comments(self, total, users, first_post, dates):
+        rnd = self.rnd
+        posts = next_pk(Post) - first_post
+        if not posts:
+            return
+
+        def comments():
+            for _ in range(total):
+                # свежие посты обсуждают чаще старых
+                number = posts - 1 - int(posts * rnd.random() ** 3)
+                created = dates(number) + timedelta(
+                    minutes=rnd.randint(1, 600))
+                yield Comment(
+                    post_id=first_post + number, author_id=rnd.choice(users),
+                    text=rnd.choice(self.phrases),
+                    created=min(created, timezone.now()))
+
+        self.save(Comment, comments(), 'Комментарии')
@@ -0,0 +1,54 @@
+import os
+from functools import partial
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+from yatube.workers import init_worker
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры всех картинок постов параллельно на всех ядрах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов (по умолчанию - число ядер).')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать и уже существующие миниатюры.')
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('image').values_list('image', flat=True).distinct()
+        )
+        job = partial(generate_thumbnails, force=options['force'])
+        workers = options['workers']
+        done = failed = 0
+        if workers <= 1:
+            results = map(job, names.iterator())
+            done, failed = self.report(results)
+        else:
+            names = list(names)
+            # дочерние процессы не должны делить соединение родителя
+            connections.close_all()
+            with Pool(workers, initializer=init_worker) as pool:
+                results = pool.imap_unordered(job, names, chunksize=8)
+                done, failed = self.report(results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибками: {failed}'))
+
+    def report(self, results):
+        done = failed = 0
+        for ok in results:
+            if ok:
+                done += 1
+            else:
+                failed += 1
+            if (done + failed) % 100 == 0:
+                self.stdout.write(f'Обработано картинок: {done + failed}')
+        return done, failed
@@ -0,0 +1,97 @@
+from django.core import serializers
+from django.core.serializers.base import DeserializationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+from posts.dataset import (DATASET_MODELS, dataset_models, iter_records,
+                           open_dataset, raw_dates, rebuild_derived,
+                           reset_sequences)
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_posts (JSON Lines) или dump.json '
+            'пачками через bulk_create; память не растет с размером файла.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл (*.gz - со сжатием) или "-" для stdin.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько записей сохранять в одной транзакции.')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.imported = {}
+        models = dataset_models()
+        stream = open_dataset(options['path'], 'r')
+        try:
+            # как loaddata: записи могут ссылаться на еще не загруженные,
+            # поэтому ключи проверяются один раз в конце
+            with connection.constraint_checks_disabled(), raw_dates(models):
+                self.load(iter_records(stream))
+            connection.check_constraints(
+                table_names=[model._meta.db_table for model in models])
+        except (ValueError, DeserializationError, DatabaseError,
+                IntegrityError) as error:
+            raise CommandError(f'Импорт не удался: {error}')
+        finally:
+            if options['path'] != '-':
+                stream.close()
+        reset_sequences(models)
+        rebuild_derived(self.chunk_size, self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {sum(self.imported.values())}'))
+
+    def load(self, records):
+        # прочие модели из dump.json (сессии, журнал админки, права,
+        # кеш миниатюр) к набору данных не относятся
+        records = (
+            record for record in records
+            if record.get('model') in DATASET_MODELS
+        )
+        batch = []
+        for item in serializers.deserialize(
+                'python', records, ignorenonexistent=True):
+            if batch and (type(item.object) is not type(batch[0].object)
+                          or len(batch) >= self.chunk_size):
+                self.flush(batch)
+                batch = []
+            batch.append(item)
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch):
+        'Сохраняет пачку одной модели: новые - bulk_create, старые - update.'
+        model = type(batch[0].object)
+        objects = [item.object for item in batch]
+        with transaction.atomic():
+            existing = set(model._default_manager.filter(
+                pk__in=[obj.pk for obj in objects]
+            ).values_list('pk', flat=True))
+            model._default_manager.bulk_create(
+                [obj for obj in objects if obj.pk not in existing])
+            fields = [field.name for field in model._meta.concrete_fields
+                      if not field.primary_key]
+            updated = [obj for obj in objects if obj.pk in existing]
+            if updated:
+                model._default_manager.bulk_update(updated, fields)
+            self.save_m2m(model, batch)
+        label = model._meta.label_lower
+        self.imported[label] = self.imported.get(label, 0) + len(batch)
+        self.stdout.write(f'{label}: {self.imported[label]}')
+
+    def save_m2m(self, model, batch):
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            source = field.m2m_field_name() + '_id'
+            target = field.m2m_reverse_field_name() + '_id'
+            rows = [
+                through(**{source: item.object.pk, target: value})
+                for item in batch
+                for value in item.m2m_data.get(field.name, [])
+            ]
+            # как у loaddata: связи из файла заменяют прежние
+            through.objects.filter(**{
+                source + '__in': [item.object.pk for item in batch]
+            }).delete()
+            through.objects.bulk_create(rows)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Follow, Post, Timeline
+from posts.signals import TIMELINE_BATCH_SIZE
+
+# ленты подписчиков из диапазона id одним INSERT ... SELECT: строки не
+# проходят через Python, что важно на миллионах записей
+REBUILD_SQL = (
+    f'INSERT INTO {Timeline._meta.db_table} '
+    '(user_id, post_id, author_id, pub_date) '
+    'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+    f'FROM {Follow._meta.db_table} f INNER JOIN {Post._meta.db_table} p '
+    'ON p.author_id = f.author_id WHERE f.user_id BETWEEN %s AND %s'
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (posts_timeline) пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=TIMELINE_BATCH_SIZE,
+            help='Сколько подписчиков пересобирать в одной транзакции.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        followers = (
+            Follow.objects.order_by('user_id')
+            .values_list('user_id', flat=True).distinct()
+        )
+        last_id = 0
+        rebuilt = 0
+        while True:
+            batch = list(followers.filter(user_id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            with transaction.atomic():
+                self.rebuild(batch[0], batch[-1])
+            rebuilt += len(batch)
+            self.stdout.write(f'Пересобрано лент: {rebuilt}')
+        # ленты тех, кто больше ни на кого не подписан
+        Timeline.objects.exclude(
+            user_id__in=Follow.objects.values('user_id')).delete()
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def rebuild(self, first_id, last_id):
+        Timeline.objects.filter(
+            user_id__gte=first_id, user_id__lte=last_id).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL, [first_id, last_id])
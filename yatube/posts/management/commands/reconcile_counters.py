@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import count_subquery
+from posts.models import Follow, Post, UserCounters
+
+User = get_user_model()
+
+FIELDS = ('posts_count', 'following_count', 'followers_count')
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики авторов (posts_usercounters) с COUNT(*).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей сверять в одной транзакции.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = User.objects.order_by('pk').annotate(
+            actual_posts=count_subquery(Post.objects, 'author'),
+            actual_following=count_subquery(Follow.objects, 'user'),
+            actual_followers=count_subquery(Follow.objects, 'author'),
+        ).values_list('pk', 'actual_posts', 'actual_following',
+                      'actual_followers')
+        last_pk = 0
+        checked = fixed = 0
+        while True:
+            with transaction.atomic():
+                batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                fixed += self.reconcile(batch)
+            checked += len(batch)
+            self.stdout.write(f'Проверено: {checked}, исправлено: {fixed}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def reconcile(self, batch):
+        stored = {
+            counters.user_id: counters
+            for counters in UserCounters.objects.select_for_update().filter(
+                user_id__in=[row[0] for row in batch])
+        }
+        fixed = 0
+        for user_id, *actual in batch:
+            actual = dict(zip(FIELDS, actual))
+            counters = stored.get(user_id)
+            if counters is None:
+                UserCounters.objects.create(user_id=user_id, **actual)
+            elif any(getattr(counters, name) != value
+                     for name, value in actual.items()):
+                UserCounters.objects.filter(user_id=user_id).update(**actual)
+            else:
+                continue
+            fixed += 1
+        return fixed
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.28 on 2026-10-18 02:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def count_related(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+        ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    # строки для уже зарегистрированных пользователей: иначе их счетчики
+    # пришлось бы создавать прямо в GET-запросе к профилю
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    db_alias = schema_editor.connection.alias
+    users = User.objects.using(db_alias).order_by('pk').annotate(
+        actual_posts=count_related(Post, 'author'),
+        actual_following=count_related(Follow, 'user'),
+        actual_followers=count_related(Follow, 'author'),
+    ).values_list('pk', 'actual_posts', 'actual_following',
+                  'actual_followers')
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        UserCounters.objects.using(db_alias).bulk_create([
+            UserCounters(user_id=pk, posts_count=posts,
+                         following_count=following, followers_count=followers)
+            for pk, posts, following, followers in batch
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 02:55
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+    # Хранилище не меняет схему, но SQLite в Django 2.2 пересоздал бы
+    # таблицу posts_post при AlterField и потерял триггеры поиска (0013):
+    # меняем только состояние моделей
+    dependencies = [
+        ('posts', '0013_post_fts'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentHashStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+    ]
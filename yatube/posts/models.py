@@ -1,10 +1,28 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import F, UniqueConstraint
+
+from . images import normalize_image
+from . storage import post_image_storage
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        'Все, что читает карточка поста, одним запросом.'
+        # автор и группа приходят через JOIN, число комментариев хранится
+        # в самом посте, иначе каждая карточка делает свои запросы
+        return self.select_related('author', 'group')
+
+    def timeline(self, user):
+        'Посты из готовой ленты подписок пользователя (Timeline).'
+        # поля ленты нужны для сортировки по её индексу
+        return self.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post'))
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст', help_text='Введите текст')
     # #verbose_name='Текст' меняет на странице лейбл text на Текст
@@ -18,17 +36,46 @@ class Post(models.Model):
                               help_text='Выберите группу')
 # on_delete=models.CASCADE удаляет все посты автора при его удалении
 # on_delete=models.SET_NULL посты остаются без группы
+    # имя файла - хеш содержимого: одинаковые загрузки делят файл
+    # и миниатюры (posts/storage.py)
     image = models.ImageField(
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True, null=True,
         verbose_name='Картинка')
+    # обновляется сигналами при создании и удалении комментария
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+
+    objects = PostQuerySet.as_manager()
+
+    # сортировка для PostQuerySet.timeline()
+    TIMELINE_ORDERING = ('-timeline_date', '-timeline_post')
 
     class Meta:
-        ordering = ['-pub_date']
+        # id в сортировке и индексах - для одинаковых дат (и курсора)
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # только что загруженный файл перекодируется (posts/images.py),
+        # уже сохраненный или путь к файлу - нет
+        if self.image and not self.image._committed:
+            normalized = normalize_image(self.image)
+            if normalized is not None:
+                self.image = normalized
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -50,6 +97,12 @@ class Comment(models.Model):
                             help_text='Введите текст')
     created = models.DateTimeField('date published', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User,
@@ -64,3 +117,47 @@ class Follow(models.Model):
             UniqueConstraint(
                 fields=['author', 'user'],
                 name='unique_following')]
+
+
+class Timeline(models.Model):
+    'Готовая лента подписок: строка на каждый пост каждому подписчику.'
+    # Заполняется при публикации поста (posts/signals.py), поэтому
+    # лента подписок читается одним диапазоном по индексу пользователя
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # автор и дата продублированы из поста: по автору удаляем записи
+    # при отписке, по дате сортируем без обращения к posts_post
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_post')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class UserCounters(models.Model):
+    'Счетчики для карточки автора, их обновляют сигналы (posts/signals.py).'
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='counters')
+    posts_count = models.PositiveIntegerField(default=0)
+    # на сколько авторов подписан пользователь
+    following_count = models.PositiveIntegerField(default=0)
+    # сколько пользователей подписано на автора
+    followers_count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class CursorPage:
+    """Страница ленты, полученная поиском по ключу (keyset)."""
+    # Признак для шаблона includes/paginator.html
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 number=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def count(self, value):
+        return self.object_list.count(value)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'prev')
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод без OFFSET и COUNT(*).
+
+    Следующая страница ищется условием WHERE (pub_date, id) < курсор,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Курсор - непрозрачная строка, её отдаем в ?cursor=.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+
+    def _ordered(self, reverse=False):
+        if reverse:
+            ordering = [
+                name[1:] if name.startswith('-') else '-' + name
+                for name in self.ordering
+            ]
+        else:
+            ordering = self.ordering
+        return self.object_list.order_by(*ordering)
+
+    def _seek(self, values, forward):
+        """Условие "строго после курсора" по всем полям сортировки."""
+        # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y)
+        less = self.descending == forward
+        lookup = 'lt' if less else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{'%s__%s' % (name, lookup): values[position]})
+            for prev_name, prev_value in zip(self.fields[:position],
+                                             values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _field(self, name):
+        'Поле модели или аннотации queryset, по которому идет сортировка.'
+        annotations = self.object_list.query.annotations
+        if name in annotations:
+            return annotations[name].output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (direction, values) или None для битого курсора."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, values = data[0], data[1:]
+            if direction not in ('next', 'prev'):
+                return None
+            if len(values) != len(self.fields):
+                return None
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, KeyError, IndexError,
+                binascii.Error, ValidationError):
+            return None
+        return direction, values
+
+    def get_page(self, cursor=None):
+        """
+        Возвращает страницу по курсору. Отсутствующий или битый
+        курсор дает первую страницу, как Paginator.get_page().
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            rows = list(self._ordered()[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self,
+                              has_next=len(rows) > self.per_page,
+                              has_previous=False, number=1)
+        direction, values = decoded
+        forward = direction == 'next'
+        queryset = self._ordered(reverse=not forward).filter(
+            self._seek(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self.get_page()
+        if forward:
+            return CursorPage(rows, self, has_next=has_more,
+                              has_previous=True)
+        rows.reverse()
+        return CursorPage(rows, self, has_next=True, has_previous=has_more)
+
+    def get_numbered_page(self, number):
+        """
+        Страница по старому ?page=N через OFFSET, но без COUNT(*).
+        Ссылки с нее уже ведут на курсоры.
+        """
+        offset = (number - 1) * self.per_page
+        rows = list(self._ordered()[offset:offset + self.per_page + 1])
+        if not rows:
+            return self.get_page()
+        return CursorPage(rows[:self.per_page], self,
+                          has_next=len(rows) > self.per_page,
+                          has_previous=number > 1, number=number)
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+
+from . models import Post
+from . paginators import CursorPage
+
+# Полнотекстовый индекс по posts_post.text (SQLite FTS5, external content).
+# Таблицу и триггеры синхронизации создает миграция 0013_post_fts.
+FTS_TABLE = 'posts_post_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """
+    Превращает ввод пользователя в безопасный запрос MATCH:
+    каждое слово в кавычках, все слова обязательны.
+    """
+    words = WORD_RE.findall(text)
+    return ' '.join('"%s"' % word for word in words)
+
+
+def matching_ids_sql(text):
+    'Подзапрос с id постов, найденных индексом, и его параметры.'
+    query = fts_query(text)
+    if not query:
+        return None
+    return (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [query])
+
+
+class SearchPaginator:
+    """
+    Найденные посты по убыванию релевантности (bm25) страницами
+    по курсору (rank, id), как CursorPaginator у лент.
+    """
+
+    def __init__(self, text, per_page):
+        self.query = fts_query(text)
+        self.per_page = int(per_page)
+
+    def _ranked(self, after, forward, limit):
+        # bm25 меньше - релевантнее, поэтому "вперед" - по возрастанию
+        sql = (f'SELECT id, rank FROM (SELECT rowid AS id, '
+               f'bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s)')
+        params = [self.query]
+        if after is not None:
+            sign = '>' if forward else '<'
+            sql += f' WHERE rank {sign} %s OR (rank = %s AND id {sign} %s)'
+            params += [after[0], after[0], after[1]]
+        order = 'ASC' if forward else 'DESC'
+        sql += f' ORDER BY rank {order}, id {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _posts(self, rows):
+        posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+        result = []
+        for post_id, rank in rows:
+            # пост могли удалить между двумя запросами
+            if post_id in posts:
+                post = posts[post_id]
+                post.search_rank = rank
+                result.append(post)
+        return result
+
+    def encode_cursor(self, post, direction):
+        raw = json.dumps([direction, post.search_rank, post.id])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, rank, post_id = json.loads(
+                base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'prev'):
+                return None
+            return direction, (float(rank), int(post_id))
+        except (ValueError, TypeError, binascii.Error):
+            return None
+
+    def get_page(self, cursor=None):
+        if not self.query:
+            return CursorPage([], self, has_next=False, has_previous=False,
+                              number=1)
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            rows = self._ranked(None, True, self.per_page + 1)
+            return CursorPage(self._posts(rows[:self.per_page]), self,
+                              has_next=len(rows) > self.per_page,
+                              has_previous=False, number=1)
+        direction, after = decoded
+        forward = direction == 'next'
+        rows = self._ranked(after, forward, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self.get_page()
+        if forward:
+            return CursorPage(self._posts(rows), self, has_next=has_more,
+                              has_previous=True)
+        rows.reverse()
+        return CursorPage(self._posts(rows), self, has_next=True,
+                          has_previous=has_more)
@@ -0,0 +1,165 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from . cache import bump_feed_version, bump_post_versions, bump_versions
+from . models import Comment, Follow, Group, Post, Timeline, UserCounters
+
+User = get_user_model()
+
+# Сколько строк ленты вставлять одним INSERT
+TIMELINE_BATCH_SIZE = 1000
+
+
+def bulk_create_timeline(entries, batch_size=TIMELINE_BATCH_SIZE):
+    'Вставляет строки ленты пачками, не собирая их все в память.'
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        Timeline.objects.bulk_create(batch)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    'Новый пост попадает в ленты всех подписчиков автора.'
+    if not created:
+        return
+    followers = Follow.objects.filter(
+        author_id=instance.author_id).values_list('user_id', flat=True)
+    bulk_create_timeline(
+        Timeline(user_id=user_id, post=instance,
+                 author_id=instance.author_id, pub_date=instance.pub_date)
+        for user_id in followers.iterator())
+
+
+@receiver(post_save, sender=Post)
+def invalidate_feeds_on_edit(sender, instance, created, **kwargs):
+    'Правка поста сразу видна во всех лентах.'
+    # новый пост появляется в лентах по истечении кеша, как и раньше
+    if not created:
+        bump_feed_version()
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_feeds_on_delete(sender, instance, **kwargs):
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    'При подписке в ленту добавляются уже опубликованные посты автора.'
+    if not created:
+        return
+    posts = Post.objects.filter(
+        author_id=instance.author_id).values_list('id', 'pub_date')
+    bulk_create_timeline(
+        Timeline(user_id=instance.user_id, post_id=post_id,
+                 author_id=instance.author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator())
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    'При отписке посты автора убираются из ленты.'
+    Timeline.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id).delete()
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, **kwargs):
+    'У нового пользователя сразу есть строка счетчиков.'
+    if created:
+        UserCounters.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.user_id, 'following_count', 1)
+        counters.change(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change(instance.user_id, 'following_count', -1)
+    counters.change(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    # срабатывает и при удалении из админки
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=F('comments_count') - 1)
+
+
+# Страницы гостей (posts/conditional.py) сбрасываются по объектам:
+# удаления и правки постов меняют версию лент, остальное - версии только
+# тех страниц, на которых оно видно. Новые посты в общей ленте - по
+# истечении кеша, как и раньше
+@receiver(post_save, sender=Post)
+def invalidate_author_pages(sender, instance, created, **kwargs):
+    'Новый пост: счетчик и список постов автора, страница группы.'
+    if created:
+        bump_post_versions([instance.pk])
+        bump_versions(author_objects([instance.author_id]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_pages(sender, instance, **kwargs):
+    'Комментарий виден на странице поста и в счетчиках карточек.'
+    bump_post_versions([instance.post_id])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    'Подписка меняет счетчики обоих пользователей и ленту подписок.'
+    bump_versions([
+        ('follow', instance.user_id),
+        *author_objects([instance.user_id, instance.author_id]),
+    ])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, update_fields, **kwargs):
+    # вход обновляет только last_login, его на страницах нет
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_versions([('author', instance.username)])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feeds_on_group_change(sender, instance, **kwargs):
+    'Название группы есть в карточке каждого её поста во всех лентах.'
+    bump_feed_version()
+
+
+def author_objects(user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    return [('author', username) for username in usernames]
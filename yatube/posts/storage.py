@@ -0,0 +1,89 @@
+"""
+Хранилище картинок постов с именами по содержимому:
+posts/ab/cdef....jpg, где abcdef... - SHA-256 файла.
+
+Одинаковые загрузки получают одно имя, а значит один файл и один набор
+миниатюр sorl-thumbnail (их имена выводятся из имени исходника).
+Содержимое файла по адресу никогда не меняется, поэтому его можно
+отдавать с Cache-Control: immutable (см. serve_immutable).
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+# имя файла, уже названного по содержимому
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{62}\.\w+$')
+# миниатюры sorl-thumbnail: имя - хеш имени исходника и параметров
+THUMBNAIL_NAME_RE = re.compile(
+    r'^cache/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.\w+$')
+
+# год - наибольший срок, который рекомендует RFC 7234
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    'FileSystemStorage, который называет файлы по SHA-256 содержимого.'
+
+    def hashed_name(self, name, content):
+        'Имя по содержимому в том же каталоге и с тем же расширением.'
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(
+            directory, digest[:2], digest[2:] + extension).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        # такой файл уже загружали: используем его
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # тот же файл одновременно записал другой запрос
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # вызывается, только если файл появился между exists() и записью:
+        # вместо переименования (name_XXXXXXX.jpg) отдаем готовый
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+
+post_image_storage = ContentHashStorage()
+
+
+def serve_immutable(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve для отладки: картинки с именами по
+    содержимому и их миниатюры отдаются с кешированием на год.
+    """
+    response = serve(request, path, document_root, show_indexes)
+    immutable = is_hashed_name(path) or THUMBNAIL_NAME_RE.match(path)
+    if response.status_code == 200 and immutable:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,44 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.cache import get_or_compute
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            timeout = int(timeout)
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on])
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout)
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """
+    Как {% cache %}, но истекший фрагмент пересчитывает один запрос,
+    а остальные получают прежний (get_or_compute в posts/cache.py).
+
+        {% fragment_cache timeout name [vary_on ...] %}
+        ...
+        {% endfragment_cache %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает хотя бы два аргумента")
+    return FragmentCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]])
@@ -0,0 +1,50 @@
+from django import template
+
+from posts.thumbnails import (THUMBNAIL_SPECS, THUMBNAIL_SRCSETS, backend,
+                              prefetch_thumbnails, schedule_thumbnails)
+from yatube.metrics import timed
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_page_thumbnails(posts):
+    'Миниатюры всех постов страницы одним обращением к KV store.'
+    with timed('thumbnail'):
+        prefetch_thumbnails([post.image for post in posts])
+    return ''
+
+
+@register.simple_tag
+def post_thumbnail(image, spec='feed'):
+    """
+    Готовая миниатюра картинки поста или None. Шаблон не ждет создания
+    миниатюры: недостающая ставится в очередь, а пока рисуется заглушка.
+    """
+    if not image:
+        return None
+    geometry, options = THUMBNAIL_SPECS[spec]
+    with timed('thumbnail'):
+        thumbnail = backend.get_cached_thumbnail(image, geometry, **options)
+    if thumbnail is None:
+        schedule_thumbnails(image.name)
+    return thumbnail
+
+
+@register.simple_tag
+def post_srcset(image, spec='feed'):
+    """
+    srcset из готовых вариантов миниатюры: "адрес 480w, адрес 960w, ...".
+    Пока варианты не созданы, в нем только те, что уже есть.
+    """
+    if not image:
+        return ''
+    candidates = []
+    for name in THUMBNAIL_SRCSETS[spec]:
+        geometry, options = THUMBNAIL_SPECS[name]
+        with timed('thumbnail'):
+            thumbnail = backend.get_cached_thumbnail(
+                image, geometry, **options)
+        if thumbnail is not None:
+            candidates.append(f'{thumbnail.url} {thumbnail.width}w')
+    return ', '.join(candidates)
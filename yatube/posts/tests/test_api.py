@@ -0,0 +1,137 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+# python manage.py test posts.tests.test_api -v 0
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    """JSON API лент"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='Pascha', first_name='Павел')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='описание')
+        cls.posts = [
+            Post.objects.create(text=f'пост {number}', author=cls.author,
+                                group=cls.group if number % 2 else None)
+            for number in range(25)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = cls.posts[-1]
+        Comment.objects.create(post=cls.post, author=cls.reader, text='раз')
+        Comment.objects.create(post=cls.post, author=cls.author, text='два')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, url, client=None, **kwargs):
+        response = (client or self.guest_client).get(url, **kwargs)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(response.content)
+
+    def test_cursor_pagination(self):
+        """Курсор проходит ленту целиком без повторов и пропусков"""
+        url = reverse('api_posts')
+        seen = []
+        while url:
+            response, data = self.get(url + '&limit=10' if '?' in url
+                                      else url + '?limit=10')
+            self.assertEqual(response.status_code, 200)
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+    def test_post_card(self):
+        """Карточка поста: автор и группа одним запросом"""
+        url = reverse('api_group', kwargs={'slug': self.group.slug})
+        with self.assertNumQueries(2):
+            response, data = self.get(url)
+        card = data['results'][0]
+        self.assertEqual(card['author'],
+                         {'username': 'Pascha', 'full_name': 'Павел'})
+        self.assertEqual(card['group']['slug'], self.group.slug)
+        self.assertEqual(data['group']['title'], self.group.title)
+        self.assertIsNone(card['image'])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только выбранные поля"""
+        url = reverse('api_posts')
+        response, data = self.get(url, data={'fields': 'id,text'})
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertIn('fields=id%2Ctext', data['next'])
+        response, data = self.get(url, data={'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_with_comments(self):
+        """Пост с комментариями в порядке написания"""
+        response, data = self.get(
+            reverse('api_post', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(data['comments_count'], 2)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['раз', 'два'])
+        response, data = self.get(
+            reverse('api_post', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(COMMENTS_PER_PAGE=1)
+    def test_post_comments_paged(self):
+        """Комментарии к посту отдаются страницами по курсору"""
+        url = reverse('api_post', kwargs={'post_id': self.post.pk})
+        response, data = self.get(url, data={'fields': 'id'})
+        self.assertEqual(data['comments'][0]['text'], 'раз')
+        self.assertIsNone(data['comments_previous'])
+        self.assertIn('fields=id', data['comments_next'])
+        response, data = self.get(data['comments_next'])
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']], ['два'])
+        self.assertIsNone(data['comments_next'])
+        self.assertIsNotNone(data['comments_previous'])
+
+    def test_follow_feed(self):
+        """Лента подписок - только вошедшим"""
+        url = reverse('api_follow')
+        response, data = self.get(url)
+        self.assertEqual(response.status_code, 401)
+        response, data = self.get(url, self.reader_client)
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['id'], self.post.pk)
+
+    def test_cached_and_etag(self):
+        """Повторный ответ из кеша без базы, по ETag - 304"""
+        url = reverse('api_profile', kwargs={'username': 'Pascha'})
+        response, data = self.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            again = self.guest_client.get(url)
+        self.assertEqual(again.content, response.content)
+        not_modified = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        # лишние параметры не создают новых записей в кеше
+        with self.assertNumQueries(0):
+            junk = self.guest_client.get(url, {'utm_source': 'mail'})
+        self.assertEqual(junk.content, response.content)
+        # правка поста сразу сбрасывает кеш
+        self.post.text = 'исправлено'
+        self.post.save()
+        response, data = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['results'][0]['text'], 'исправлено')
+
+    def test_read_only(self):
+        """Писать через API нельзя"""
+        response = self.reader_client.post(reverse('api_posts'))
+        self.assertEqual(response.status_code, 405)
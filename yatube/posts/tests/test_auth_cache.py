@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.cache import bump_feed_version
+from posts.models import Post
+from users.middleware import cached_user, user_cache_key
+
+# python manage.py test posts.tests.test_auth_cache -v 0
+
+User = get_user_model()
+
+# таблицы, которые читали штатные сессии и AuthenticationMiddleware
+AUTH_TABLES = ('"django_session"', 'FROM "auth_user"')
+
+
+class AuthCacheTest(TestCase):
+    """Сессия и пользователь запроса читаются из кеша"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', password='old-password-1')
+        Post.objects.create(author=cls.user, text='Пост для ленты')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='reader', password='old-password-1')
+
+    def auth_queries(self, captured):
+        return [query['sql'] for query in captured if any(
+            table in query['sql'] for table in AUTH_TABLES)]
+
+    def test_index_query_count(self):
+        """Со второй страницы база читается только ради самой ленты"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse('index'))
+        # лента (число постов и страница), сессия и пользователь
+        self.assertEqual(len(cold), 4)
+        self.assertEqual(len(self.auth_queries(cold)), 2)
+        bump_feed_version()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Пост для ленты')
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_guest_has_no_auth_queries(self):
+        """У гостя нет сессии: ни одного запроса к её таблице"""
+        with CaptureQueriesContext(connection) as captured:
+            Client().get(reverse('index'))
+        self.assertEqual(self.auth_queries(captured), [])
+
+    def test_password_change_logs_out_other_sessions(self):
+        """Смена пароля сразу завершает остальные сессии"""
+        other = Client()
+        other.login(username='reader', password='old-password-1')
+        other.get(reverse('index'))
+        self.client.get(reverse('index'))
+        response = self.client.post(reverse('password_change'), {
+            'old_password': 'old-password-1',
+            'new_password1': 'new-password-2',
+            'new_password2': 'new-password-2',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.client.get(
+            reverse('index')).context['user'].is_authenticated)
+        self.assertFalse(other.get(
+            reverse('index')).context['user'].is_authenticated)
+
+    def test_profile_change_visible(self):
+        """Новое имя пользователя видно на следующей же странице"""
+        self.client.get(reverse('index'))
+        User.objects.filter(pk=self.user.pk).update(username='kept')
+        # update() не шлет сигналов: до истечения кеша - старое имя
+        self.assertContains(
+            self.client.get(reverse('index')), 'Пользователь: reader')
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertContains(
+            self.client.get(reverse('index')), 'Пользователь: renamed')
+
+    def test_cache_has_no_password(self):
+        """В общем кеше нет хеша пароля, только то, что нужно запросу"""
+        self.client.get(reverse('index'))
+        data = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(set(data), {
+            'pk', 'username', 'is_active', 'is_staff', 'is_superuser',
+            'session_hash'})
+        self.assertNotIn(self.user.password, data.values())
+
+    def test_stale_user_after_save_ignored(self):
+        """Пользователь, прочитанный до смены пароля, не оживляет сессию"""
+        self.client.get(reverse('index'))
+        stale_key = user_cache_key(self.user.pk)
+        stale = cache.get(stale_key)
+        self.user.set_password('new-password-2')
+        self.user.save()
+        # медленный запрос кладет старую запись уже после сигнала
+        cache.set(stale_key, stale)
+        self.assertFalse(self.client.get(
+            reverse('index')).context['user'].is_authenticated)
+
+    def test_cached_user_flags_without_queries(self):
+        """Флаги доступа приходят из кеша, а не отдельными запросами"""
+        self.client.get(reverse('index'))
+        user = cached_user(cache.get(user_cache_key(self.user.pk)))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                (user.is_active, user.is_staff, user.is_superuser),
+                (True, False, False))
+
+    def test_inactive_user_rejected(self):
+        """Неактивный пользователь не входит и по записи из кеша"""
+        self.client.get(reverse('index'))
+        key = user_cache_key(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # запись, положенная до деактивации без сигнала
+        cache.set(key, dict(cache.get(key), is_active=False))
+        self.assertFalse(self.client.get(
+            reverse('index')).context['user'].is_authenticated)
@@ -0,0 +1,99 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from posts.counters import count_actual
+from posts.management.commands.benchmark_urls import percentile
+from posts.models import Comment, Follow, Group, Post, Timeline
+
+# python manage.py test posts.tests.test_benchmarks -v 0
+
+User = get_user_model()
+
+
+class GenerateDatasetTest(TestCase):
+    """Синтетические данные согласованы так же, как созданные через сайт"""
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', users=30, groups=3, posts=200,
+                     comments=50, follows=4, batch_size=64, stdout=StringIO())
+
+    def test_sizes(self):
+        """Создано ровно столько записей, сколько заказано"""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+
+    def test_derived_data(self):
+        """Ленты, счетчики и число комментариев пересчитаны"""
+        self.assertEqual(
+            Timeline.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count())
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 50)
+        for user in User.objects.select_related('counters')[:10]:
+            counters = user.counters
+            self.assertEqual(count_actual(user.pk), {
+                'posts_count': counters.posts_count,
+                'following_count': counters.following_count,
+                'followers_count': counters.followers_count,
+            })
+
+    def test_posts_follow_publication_order(self):
+        """Даты постов растут вместе с pk, как у настоящих"""
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+
+
+class BenchmarkUrlsTest(TestCase):
+    """Замер адресов отдает машиночитаемый отчет по каждому маршруту"""
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_dataset', users=20, groups=2, posts=60,
+                     comments=20, follows=5, stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_report(self):
+        """Отчет есть по каждому адресу, кроме меняющих данные"""
+        output = StringIO()
+        call_command('benchmark_urls', repeat=2, warmup=0, json=True,
+                     stdout=output)
+        report = json.loads(output.getvalue())
+        names = {row['name'] for row in report['results']}
+        self.assertTrue({'index', 'profile', 'post', 'follow_index',
+                         'about:author'} <= names)
+        self.assertNotIn('profile_follow', names)
+        for row in report['results']:
+            with self.subTest(url=row['url'], client=row['client']):
+                self.assertLess(row['status'], 400)
+                self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+                self.assertGreaterEqual(row['queries'], 0)
+
+    def test_cold_run_keeps_site_cache(self):
+        """--cold очищает свой кеш, а не кеш сайта"""
+        cache.set('site-key', 'value')
+        call_command('benchmark_urls', repeat=2, warmup=0, cold=True,
+                     only=['index'], json=True, stdout=StringIO())
+        self.assertEqual(cache.get('site-key'), 'value')
+
+
+class PercentileTest(SimpleTestCase):
+    """Процентили считаются без statistics.quantiles (Python 3.7)"""
+    def test_percentile(self):
+        """Интерполяция между соседними значениями, порядок не важен"""
+        values = [4, 1, 3, 2, 5]
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertAlmostEqual(percentile(values, 99), 4.96)
+        self.assertAlmostEqual(percentile(values, 1), 1.04)
+        self.assertEqual(percentile([7], 99), 7)
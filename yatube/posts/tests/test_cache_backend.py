@@ -0,0 +1,149 @@
+import multiprocessing
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+from yatube.cache_backends import SQLiteCache, _Transaction
+
+# python manage.py test posts.tests.test_cache_backend -v 0
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {'TIMEOUT': 60, 'OPTIONS': options})
+
+
+def increment(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class LockedOnCommit:
+    'Соединение, у которого COMMIT не проходит, как при занятой базе.'
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:', isolation_level=None)
+
+    def execute(self, sql, *args):
+        if sql == 'COMMIT':
+            raise sqlite3.OperationalError('database is locked')
+        return self.connection.execute(sql, *args)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Общий кеш в SQLite ведет себя как кеш Django и виден всем процессам"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """set/get/add/delete/get_many работают как у locmem"""
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'posts': [1, 2]})
+        self.assertEqual(cache.get('key'), {'posts': [1, 2]})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete_many(['a', 'key'])
+        self.assertFalse(cache.has_key('a'))
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get_or_set('version', 7), 7)
+        self.assertEqual(cache.incr('version'), 8)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.clear()
+        self.assertIsNone(cache.get('b'))
+
+    def test_expired_keys_are_missing(self):
+        """Просроченный ключ не возвращается и не мешает add()"""
+        self.cache.set('key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+        self.assertTrue(self.cache.touch('key', timeout=None))
+        self.assertEqual(self.cache.get('key'), 'fresh')
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра (процесса) видна другому"""
+        other = make_cache(self.path)
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_is_atomic_across_processes(self):
+        """Параллельные incr() из разных процессов не теряют обновлений"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_evicts_least_recently_read(self):
+        """Сверх MAX_SIZE вытесняются давно не читанные ключи"""
+        cache = make_cache(self.path, MAX_SIZE=10000, CULL_FREQUENCY=4,
+                           LRU_RESOLUTION=0)
+        value = 'x' * 1000
+        for number in range(8):
+            cache.set(f'key{number}', value)
+        # key0 только что прочитан, поэтому он переживет вытеснение
+        cache.get('key0')
+        for number in range(8, 12):
+            cache.set(f'key{number}', value)
+        self.assertEqual(cache.get('key0'), value)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(cache.get('key11'), value)
+        size, entries = cache._connection().execute(
+            'SELECT size, entries FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(entries, len(cache.get_many(
+            [f'key{number}' for number in range(12)])))
+
+    def test_read_does_not_wait_for_writer(self):
+        """Отметка чтения для LRU не ждет блокировки писателя"""
+        cache = make_cache(self.path, BUSY_TIMEOUT=5, LRU_RESOLUTION=0)
+        cache.set('key', 'value')
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            self.assertEqual(cache.get('key'), 'value')
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        # ожидание записи не сломалось
+        self.assertEqual(cache._connection().execute(
+            'PRAGMA busy_timeout').fetchone()[0], 5000)
+
+    def test_max_entries(self):
+        """MAX_ENTRIES ограничивает число ключей, как у бэкендов Django"""
+        cache = make_cache(self.path, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for number in range(30):
+            cache.set(f'key{number}', number)
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{number}' for number in range(30)])), 10)
+        self.assertEqual(cache.get('key29'), 29)
+
+    def test_failed_commit_rolls_back(self):
+        """Если COMMIT не прошел, соединение не остается в транзакции"""
+        connection = LockedOnCommit()
+        with self.assertRaises(sqlite3.OperationalError):
+            with _Transaction(connection):
+                connection.execute('CREATE TABLE cache (key TEXT)')
+        self.assertFalse(connection.connection.in_transaction)
@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from posts.dataset import iter_records
+from posts.models import Comment, Follow, Group, Post, Timeline, UserCounters
+
+# python manage.py test posts.tests.test_dataset -v 0
+
+User = get_user_model()
+
+
+class DatasetTest(TestCase):
+    """Выгрузка и загрузка набора данных пачками"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create_user(username='Pascha')
+        self.reader = User.objects.create_user(username='Гарри')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='тестовый текст')
+        for number in range(5):
+            self.post = Post.objects.create(
+                text=f'пост {number}', author=self.author, group=self.group)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def call(self, name, *args, **options):
+        call_command(name, *args, stdout=StringIO(), stderr=StringIO(),
+                     **options)
+
+    def snapshot(self):
+        return {
+            'users': list(User.objects.values_list('pk', 'username')),
+            'posts': list(Post.objects.values_list(
+                'pk', 'text', 'pub_date', 'group', 'comments_count')),
+            'comments': list(Comment.objects.values_list(
+                'pk', 'post', 'created')),
+            'follows': list(Follow.objects.values_list('user', 'author')),
+            'timeline': Timeline.objects.filter(user=self.reader).count(),
+            'counters': list(UserCounters.objects.order_by(
+                'user').values_list()),
+        }
+
+    def test_round_trip(self):
+        """После выгрузки и загрузки в пустую базу данные те же"""
+        path = os.path.join(self.directory, 'posts.jsonl.gz')
+        before = self.snapshot()
+        self.call('export_posts', path, chunk_size=2)
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            lines = stream.read().splitlines()
+        self.assertEqual(len(lines), 2 + 1 + 5 + 1 + 1)
+        self.assertEqual(json.loads(lines[0])['model'], 'auth.user')
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.call('import_posts', path, chunk_size=2)
+        # ленты, счетчики и число комментариев восстановлены без сигналов
+        self.assertEqual(self.snapshot(), before)
+
+    def test_import_twice_updates(self):
+        """Повторная загрузка обновляет записи, а не дублирует их"""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        self.call('export_posts', path)
+        Post.objects.filter(pk=self.post.pk).update(text='изменен')
+        self.call('import_posts', path)
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text, 'пост 4')
+
+    def test_loads_legacy_dump(self):
+        """dump.json загружается как есть, лишние модели пропускаются"""
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.call('import_posts', os.path.join(settings.BASE_DIR,
+                                               'dump.json'))
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 7)
+        self.assertEqual(Comment.objects.count(), 4)
+        # даты из файла, а не время загрузки (auto_now_add)
+        self.assertEqual(Post.objects.get(pk=41).pub_date.year, 2021)
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 4)
+
+    def test_reader_streams_across_chunks(self):
+        """Массив и JSON Lines читаются кусками любой длины"""
+        records = [{'model': 'posts.group', 'pk': number,
+                    'fields': {'title': 'a, ] [ "b"'}}
+                   for number in range(5)]
+        array = json.dumps(records, indent=1)
+        lines = '\n'.join(json.dumps(record) for record in records)
+        for text in (array, lines, ' [ ] '):
+            with self.subTest(text=text[:10]):
+                with mock.patch('posts.dataset.READ_CHUNK', 7):
+                    result = list(iter_records(StringIO(text)))
+                expected = [] if text == ' [ ] ' else records
+                self.assertEqual(result, expected)
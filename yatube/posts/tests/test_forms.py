@@ -2,13 +2,15 @@ import shutil
 import tempfile
 
 from http import HTTPStatus
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.urls import reverse
-from posts.models import Group, Post
+from posts.forms import PostForm
+from posts.models import Comment, Group, Post
 
 # python manage.py test posts.tests.test_forms -v 0
 
@@ -89,7 +91,9 @@ class FormTest(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author, self.user)
         self.assertEqual(post.group, self.group)
-        self.assertEqual(post.image, 'posts/small.gif')
+        # имя файла - SHA-256 содержимого (posts/storage.py)
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{62}\.gif$')
         # Можно еще проверить наличие созданного поста:
         #  т.о assertTrue(Post.objects.filter(.., group=self.group).exists())
 
@@ -126,6 +130,23 @@ class FormTest(TestCase):
             with self.subTest(group=group):
                 self.assertEqual(posts, count)
 
+    def test_edit_keeps_comments_count(self):
+        """Комментарий, добавленный во время правки, остается в счетчике"""
+        is_valid = PostForm.is_valid
+
+        def comment_then_validate(form):
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий')
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', comment_then_validate):
+            self.authorized_client.post(
+                reverse('edit', args=[self.user.username, self.post.pk]),
+                data={'text': 'Новый текст', 'group': self.group.id})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Новый текст')
+        self.assertEqual(self.post.comments_count, 1)
+
     def test_guest_client_cant_create_post(self):
         """Неавторизованный пользователь не может публиковать пост"""
         posts_count = Post.objects.count()
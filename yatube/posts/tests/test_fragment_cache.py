@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from posts.cache import get_or_compute
+
+# python manage.py test posts.tests.test_fragment_cache -v 0
+
+
+class Compute:
+    'compute() для get_or_compute, который считает свои вызовы.'
+
+    def __init__(self, value='новое', seconds=0):
+        self.value = value
+        self.seconds = seconds
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.seconds)
+        return self.value
+
+
+class GetOrComputeTest(SimpleTestCase):
+    """Истекающее значение пересчитывает один запрос"""
+    def setUp(self):
+        cache.clear()
+
+    def store_expired(self, key, value):
+        # истекло секунду назад, но еще лежит в кеше как устаревшее
+        cache.set(key, (value, time.time() - 1, 0.01), 60)
+
+    def test_computes_and_caches(self):
+        """Первый вызов считает, следующие берут из кеша"""
+        compute = Compute()
+        self.assertEqual(get_or_compute('key', compute, 60), 'новое')
+        self.assertEqual(get_or_compute('key', compute, 60), 'новое')
+        self.assertEqual(compute.calls, 1)
+
+    def test_stale_while_revalidate(self):
+        """Пока один считает, остальные получают прежнее значение"""
+        self.store_expired('key', 'старое')
+        cache.add('key:lock', 1, 10)
+        compute = Compute()
+        self.assertEqual(get_or_compute('key', compute, 60), 'старое')
+        self.assertEqual(compute.calls, 0)
+        cache.delete('key:lock')
+        self.assertEqual(get_or_compute('key', compute, 60), 'новое')
+        self.assertEqual(compute.calls, 1)
+
+    def test_single_flight(self):
+        """Без значения в кеше одновременные запросы ждут одного"""
+        compute = Compute(seconds=0.3)
+        results = []
+
+        def request():
+            results.append(get_or_compute('key', compute, 60))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['новое'] * 8)
+        self.assertEqual(compute.calls, 1)
+
+    def test_foreign_lock_kept(self):
+        """Долгий пересчет не снимает блокировку, взятую другим запросом"""
+        def slow_compute():
+            # своя блокировка истекла, её взял другой запрос
+            cache.set('key:lock', 'чужая', 10)
+            return 'новое'
+
+        self.assertEqual(get_or_compute('key', slow_compute, 60), 'новое')
+        self.assertEqual(cache.get('key:lock'), 'чужая')
+        self.assertEqual(get_or_compute('other', Compute(), 60), 'новое')
+        self.assertIsNone(cache.get('other:lock'))
+
+    def test_early_recompute(self):
+        """Незадолго до истечения значение пересчитывается заранее"""
+        cache.set('key', ('старое', time.time() + 1, 10), 60)
+        compute = Compute()
+        with override_settings(CACHE_EARLY_BETA=0):
+            self.assertEqual(get_or_compute('key', compute, 60), 'старое')
+        # пересчет дольше оставшейся секунды: почти наверняка пора
+        with override_settings(CACHE_EARLY_BETA=1000):
+            self.assertEqual(get_or_compute('key', compute, 60), 'новое')
+        self.assertEqual(compute.calls, 1)
+
+    @override_settings(CACHE_STAMPEDE_PROTECTION=False)
+    def test_protection_off(self):
+        """Без защиты - как {% cache %}: истекшее считается сразу"""
+        self.store_expired('key', 'старое')
+        cache.add('key:lock', 1, 10)
+        compute = Compute()
+        self.assertEqual(get_or_compute('key', compute, 60), 'новое')
+
+
+class FragmentCacheTagTest(SimpleTestCase):
+    """{% fragment_cache %} кеширует фрагмент, как {% cache %}"""
+    def setUp(self):
+        cache.clear()
+
+    def test_render(self):
+        """Второй раз фрагмент берется из кеша, vary_on различает ключи"""
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% fragment_cache 60 feed key %}{{ value }}'
+            '{% endfragment_cache %}')
+        self.assertEqual(template.render(Context(
+            {'key': 1, 'value': 'первый'})), 'первый')
+        self.assertEqual(template.render(Context(
+            {'key': 1, 'value': 'второй'})), 'первый')
+        self.assertEqual(template.render(Context(
+            {'key': 2, 'value': 'второй'})), 'второй')
+
+    def test_syntax(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load fragment_cache %}{% fragment_cache 60 %}'
+                     '{% endfragment_cache %}')
+
+
+class BenchmarkStampedeTest(TransactionTestCase):
+    """Нагрузочный тест отдает отчет по обоим режимам"""
+    def setUp(self):
+        call_command('generate_dataset', users=10, groups=2, posts=30,
+                     comments=10, follows=3, stdout=StringIO())
+
+    def test_report(self):
+        """Замер идет на копии базы и в своем кеше"""
+        cache.set('site-key', 'value')
+        before = connection.settings_dict['NAME']
+        output = StringIO()
+        call_command('benchmark_stampede', threads=2, seconds=0.5,
+                     timeout=1, json=True, stdout=output)
+        self.assertEqual(cache.get('site-key'), 'value')
+        self.assertEqual(connection.settings_dict['NAME'], before)
+        # сессия входа осталась в копии
+        self.assertFalse(Session.objects.exists())
+        report = json.loads(output.getvalue())
+        modes = {row['mode']: row for row in report['results']}
+        self.assertEqual(set(modes), {'plain', 'protected'})
+        for row in modes.values():
+            with self.subTest(mode=row['mode']):
+                self.assertGreater(row['requests'], 0)
+                self.assertGreater(row['feed_queries'], 0)
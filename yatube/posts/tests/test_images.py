@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from posts.models import Post
+from posts.storage import post_image_storage, serve_immutable
+from posts.thumbnails import generate_thumbnails
+
+# python manage.py test posts.tests.test_images -v 0
+
+User = get_user_model()
+
+# тег EXIF с поворотом снимка
+ORIENTATION = 0x0112
+
+
+def upload(name, image_format, size, mode='RGB', **options):
+    output = BytesIO()
+    Image.new(mode, size, 'red').save(output, image_format, **options)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.MEDIA_ROOT),
+                   IMAGE_MAX_SIZE=400)
+class ImageNormalizationTest(TestCase):
+    """Загруженные картинки перекодируются при сохранении поста"""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+
+    def save(self, image):
+        post = Post.objects.create(
+            text='пост', author=self.author, image=image)
+        post.refresh_from_db()
+        return post, Image.open(post.image.path)
+
+    def test_camera_jpeg(self):
+        """Снимок уменьшен, повернут по EXIF, без EXIF, progressive"""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        post, image = self.save(upload(
+            'photo.JPG', 'JPEG', (1200, 900), exif=exif.tobytes()))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual(image.size, (300, 400))
+        self.assertNotIn(ORIENTATION, image.getexif())
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_transparent_png_stays_png(self):
+        """Прозрачная картинка остается PNG"""
+        post, image = self.save(
+            upload('logo.png', 'PNG', (100, 50), mode='RGBA'))
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual(image.mode, 'RGBA')
+
+    def test_gif_kept(self):
+        """GIF (возможно, анимированный) хранится как есть"""
+        gif = upload('anim.gif', 'GIF', (800, 10), mode='P')
+        content = gif.read()
+        post, image = self.save(gif)
+        self.assertTrue(post.image.name.endswith('.gif'))
+        with open(post.image.path, 'rb') as saved:
+            self.assertEqual(saved.read(), content)
+
+    @override_settings(IMAGE_FORMAT='WEBP')
+    def test_webp(self):
+        """IMAGE_FORMAT = 'WEBP' хранит картинки в WebP"""
+        post, image = self.save(upload('photo.png', 'PNG', (800, 600)))
+        self.assertTrue(post.image.name.endswith('.webp'))
+        self.assertEqual(image.format, 'WEBP')
+        self.assertEqual(image.size, (400, 300))
+
+    def test_existing_file_untouched(self):
+        """Путь к уже сохраненному файлу не перекодируется"""
+        post = Post.objects.create(
+            text='пост', author=self.author, image='posts/missing.jpg')
+        self.assertEqual(post.image.name, 'posts/missing.jpg')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.MEDIA_ROOT),
+                   THUMBNAIL_ASYNC=False)
+class ContentHashStorageTest(TestCase):
+    """Картинки называются по содержимому, дубликаты делят один файл"""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+
+    def test_same_upload_same_file(self):
+        """Одинаковые загрузки - один файл, разные - разные"""
+        names = [
+            Post.objects.create(
+                text='пост', author=self.author,
+                image=upload(name, 'PNG', size)).image.name
+            for name, size in (('a.png', (10, 10)), ('b.png', (10, 10)),
+                               ('c.png', (20, 10)))
+        ]
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        self.assertRegex(names[0], r'^posts/[0-9a-f]{2}/[0-9a-f]{62}\.jpg$')
+
+    def test_dedupe_command(self):
+        """Старые файлы переименованы по содержимому и слиты"""
+        content = upload('1.jpg', 'JPEG', (10, 10)).read()
+        legacy = [default_storage.save(name, ContentFile(content))
+                  for name in ('posts/1.jpg', 'posts/1.jpg')]
+        self.assertNotEqual(legacy[0], legacy[1])
+        posts = [Post.objects.create(text='пост', author=self.author,
+                                     image=name) for name in legacy]
+        call_command('dedupe_media', stdout=StringIO())
+        names = {post.image.name
+                 for post in Post.objects.filter(pk__in=[
+                     post.pk for post in posts])}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        with post_image_storage.open(name) as saved:
+            self.assertEqual(saved.read(), content)
+        for old in legacy:
+            self.assertFalse(default_storage.exists(old))
+        self.assertTrue(generate_thumbnails(name))
+
+    def test_immutable_cache_headers(self):
+        """Файлы с именами по содержимому кешируются навсегда"""
+        name = Post.objects.create(
+            text='пост', author=self.author,
+            image=upload('a.png', 'PNG', (10, 10))).image.name
+        default_storage.save('posts/plain.jpg', ContentFile(b'x'))
+        request = RequestFactory().get('/')
+        response = serve_immutable(
+            request, name, document_root=settings.MEDIA_ROOT)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = serve_immutable(
+            request, 'posts/plain.jpg', document_root=settings.MEDIA_ROOT)
+        self.assertFalse(response.has_header('Cache-Control'))
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+from yatube.metrics import empty_view_metrics, registry
+
+# python manage.py test posts.tests.test_metrics -v 0
+
+User = get_user_model()
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0)
+class MetricsTest(TestCase):
+    """Метрики представлений в формате Prometheus"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.metrics_dir = tempfile.mkdtemp()
+        cls.metrics_settings = override_settings(METRICS_DIR=cls.metrics_dir)
+        cls.metrics_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.metrics_settings.disable()
+        shutil.rmtree(cls.metrics_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        # метрики процесса начинаются с нуля
+        registry.pid = None
+        self.author = User.objects.create_user(username='Pascha')
+        self.post = Post.objects.create(text='пост', author=self.author)
+        self.guest_client = Client()
+        cache.clear()
+
+    def metrics(self):
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def value(self, text, series):
+        match = re.search(
+            r'^' + re.escape(series) + r' ([0-9.e+-]+)$', text, re.M)
+        self.assertIsNotNone(match, series)
+        return float(match.group(1))
+
+    def test_views_are_measured(self):
+        """Для каждого маршрута: запросы, время, база, шаблоны, размер"""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('post', kwargs={
+            'username': self.author.username, 'post_id': self.post.id}))
+        self.guest_client.get('/no/such/page/')
+        text = self.metrics()
+        self.assertEqual(self.value(
+            text, 'yatube_requests_total{view="index",status="200"}'), 2)
+        self.assertEqual(self.value(
+            text, 'yatube_request_duration_seconds_count{view="index"}'), 2)
+        self.assertEqual(self.value(
+            text, 'yatube_request_duration_seconds_bucket'
+                  '{view="index",le="+Inf"}'), 2)
+        self.assertEqual(self.value(
+            text, 'yatube_requests_total{view="unmatched",status="404"}'), 1)
+        self.assertGreater(self.value(
+            text, 'yatube_db_queries_total{view="post"}'), 0)
+        self.assertGreater(self.value(
+            text, 'yatube_template_render_seconds_total{view="post"}'), 0)
+        self.assertGreater(self.value(
+            text, 'yatube_response_bytes_total{view="index"}'), 1000)
+
+    def test_workers_are_summed(self):
+        """/metrics складывает метрики других процессов из их файлов"""
+        self.guest_client.get(reverse('index'))
+        other = {'index': empty_view_metrics()}
+        other['index']['requests'] = {'200': 5}
+        other['index']['buckets'][-1] = 5
+        # файл живого процесса
+        self.write_other(f'{os.getppid()}-1.json', other)
+        text = self.metrics()
+        self.assertEqual(self.value(
+            text, 'yatube_requests_total{view="index",status="200"}'), 6)
+        self.assertEqual(self.value(
+            text, 'yatube_request_duration_seconds_count{view="index"}'), 6)
+
+    def write_other(self, name, metrics):
+        with open(os.path.join(self.metrics_dir, name), 'w') as output:
+            json.dump(metrics, output)
+
+    @skipUnless(os.name == 'posix', 'живость процесса проверяется в POSIX')
+    def test_dead_workers_absorbed(self):
+        """Файл завершившегося процесса удаляется, счетчики не убывают"""
+        self.guest_client.get(reverse('index'))
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        other = {'index': empty_view_metrics()}
+        other['index']['requests'] = {'200': 5}
+        self.write_other(f'{finished.pid}-1.json', other)
+        self.write_other(f'{finished.pid}-2.json.tmp', other)
+        for _ in range(2):
+            text = self.metrics()
+            self.assertEqual(self.value(
+                text, 'yatube_requests_total{view="index",status="200"}'), 6)
+        self.assertEqual(os.listdir(self.metrics_dir), [registry.filename])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_hidden_from_other_addresses(self):
+        """Метрики видны только разрешенным адресам"""
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTest(TestCase):
+    """Разбивка времени запроса в Server-Timing и журнале доступа"""
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+        self.post = Post.objects.create(
+            text='пост', author=self.author, image='posts/missing.jpg')
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_header_and_log(self):
+        """SQL, шаблоны и миниатюры видны в заголовке и в строке журнала"""
+        with self.assertLogs('yatube.access', 'INFO') as logs:
+            response = self.guest_client.get(reverse('index'))
+        header = response['Server-Timing']
+        for name in ('db', 'tpl', 'thumb', 'total'):
+            self.assertRegex(header, rf'(^|, ){name};dur=[0-9.]+')
+        self.assertRegex(
+            header, r'thumb;dur=[0-9.]+;desc="Thumbnail lookups";count=2')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'index')
+        self.assertEqual(record['status'], 200)
+        # поиск миниатюр всей страницы и поиск в карточке
+        self.assertEqual(record['thumbnails'], 2)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        """Без выборки запросы проходят без заголовка"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
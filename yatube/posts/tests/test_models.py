@@ -1,6 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
-from posts.models import Group, Post
+from posts.counters import get_counters
+from posts.models import Comment, Follow, Group, Post, UserCounters
 
 # python manage.py test posts.tests.test_models
 
@@ -31,3 +35,62 @@ class PostModelTest(TestCase):
         for expected_object_name, model in object_name.items():
             with self.subTest():
                 self.assertEquals(expected_object_name, str(model))
+
+
+class UserCountersTest(TestCase):
+    """Счетчики автора меняются вместе с постами и подписками"""
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+        self.reader = User.objects.create_user(username='Гарри')
+
+    def counters(self, user):
+        counters = UserCounters.objects.get(user=user)
+        return (counters.posts_count, counters.following_count,
+                counters.followers_count)
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(text='пробный текст', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author), (1, 0, 1))
+        self.assertEqual(self.counters(self.reader), (0, 1, 0))
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 0))
+
+    def test_reconcile_counters_fixes_drift(self):
+        Post.objects.create(text='пробный текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.objects.filter(user=self.author).update(
+            posts_count=100, followers_count=0)
+        UserCounters.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.counters(self.author), (1, 0, 1))
+        self.assertEqual(self.counters(self.reader), (0, 1, 0))
+
+    def test_get_counters_without_row_does_not_write(self):
+        Post.objects.create(text='пробный текст', author=self.author)
+        UserCounters.objects.filter(user=self.author).delete()
+        author = User.objects.get(pk=self.author.pk)
+        counters = get_counters(author)
+        self.assertEqual(counters.posts_count, 1)
+        self.assertFalse(
+            UserCounters.objects.filter(user=self.author).exists())
+
+
+class CommentsCountTest(TestCase):
+    """Пост хранит число своих комментариев"""
+    def test_comments_count_follows_comments(self):
+        author = User.objects.create_user(username='Pascha')
+        post = Post.objects.create(text='пробный текст', author=author)
+        comments = [
+            Comment.objects.create(post=post, author=author, text='текст')
+            for _ in range(3)
+        ]
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 3)
+        comments[0].delete()
+        # удаление пачкой, как в админке
+        Comment.objects.filter(pk=comments[1].pk).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+# python manage.py test posts.tests.test_page_cache -v 0
+
+User = get_user_model()
+
+
+class GuestPageCacheTest(TestCase):
+    """Страницы гостей отдаются целиком из кеша"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Текст поста')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.urls = [
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+            reverse('post', args=[self.author.username, self.post.pk]),
+        ]
+
+    def test_second_request_without_queries(self):
+        """Повторный запрос гостя не доходит до базы и шаблонов"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertIsNone(second.context)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+                self.assertIn('Cookie', second['Vary'])
+                # другие cookie гостя не мешают кешу
+                self.guest_client.cookies['csrftoken'] = 'x'
+                with self.assertNumQueries(0):
+                    not_modified = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                del self.guest_client.cookies['csrftoken']
+
+    def test_users_do_not_share_guest_pages(self):
+        """Вошедший пользователь получает свою страницу, а не гостевую"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Пользователь: author')
+                self.assertIn('Cookie', response['Vary'])
+                self.assertNotContains(
+                    self.guest_client.get(url), 'Пользователь: author')
+
+    def test_changes_reset_pages(self):
+        """Правка поста и новый комментарий сразу видны гостям"""
+        url = reverse('post', args=[self.author.username, self.post.pk])
+        self.guest_client.get(url)
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertContains(self.guest_client.get(url), 'Исправленный текст')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий')
+        self.assertContains(self.guest_client.get(url), 'Новый комментарий')
+
+    def test_changes_reset_only_affected_pages(self):
+        """Комментарий и подписка сбрасывают только свои страницы"""
+        other = Post.objects.create(author=self.author, text='Другой пост')
+        reader = User.objects.create_user(username='reader')
+        post_url = reverse('post', args=[self.author.username, self.post.pk])
+        other_url = reverse('post', args=[self.author.username, other.pk])
+        for url in self.urls + [other_url]:
+            self.guest_client.get(url)
+        Comment.objects.create(
+            post=other, author=reader, text='Новый комментарий')
+        reset = {other_url, reverse('profile', args=[self.author.username])}
+        for url in set(self.urls) - reset:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url)
+        for url in reset:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertIsNotNone(self.guest_client.get(post_url).context)
+        with self.assertNumQueries(0):
+            self.guest_client.get(reverse('group', args=[self.group.slug]))
+
+    def test_errors_not_cached(self):
+        """404 не кешируется: страница может появиться"""
+        url = reverse('profile', args=['nobody'])
+        self.assertEqual(self.guest_client.get(url).status_code, 404)
+        User.objects.create_user(username='nobody')
+        self.assertEqual(self.guest_client.get(url).status_code, 200)
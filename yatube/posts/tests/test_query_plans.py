@@ -0,0 +1,82 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from posts.models import Comment, Follow, Group, Post
+
+# python manage.py test posts.tests.test_query_plans -v 0
+
+User = get_user_model()
+
+
+def query_plan(queryset):
+    """Строки EXPLAIN QUERY PLAN для запроса queryset (SQLite)"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'EXPLAIN QUERY PLAN проверяется только на SQLite')
+class QueryPlanTest(TestCase):
+    """Ленты читаются по индексу, без сортировки во временном B-дереве"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.reader = User.objects.create_user(username='Гарри')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовый текст')
+        cls.post = Post.objects.create(
+            text='пробный текст', author=cls.author, group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='комментарий')
+
+    def test_feed_queries_use_indexes(self):
+        post = QueryPlanTest.post
+        seek = (Q(pub_date__lt=post.pub_date)
+                | Q(pub_date=post.pub_date, id__lt=post.id))
+        queries = {
+            'index': (Post.objects.for_feed(), 'post_date_idx'),
+            'index_seek': (
+                Post.objects.for_feed().filter(seek), 'post_date_idx'),
+            'group': (
+                QueryPlanTest.group.posts.for_feed(), 'post_group_date_idx'),
+            'profile': (
+                QueryPlanTest.author.posts.for_feed(),
+                'post_author_date_idx'),
+            'follow': (
+                Post.objects.for_feed().timeline(
+                    QueryPlanTest.reader).order_by(*Post.TIMELINE_ORDERING),
+                'timeline_user_date_idx'),
+            'comments': (
+                post.comments.order_by('created', 'id'),
+                'comment_post_created_idx'),
+            'comments_seek': (
+                post.comments.filter(
+                    Q(created__gt=post.pub_date)
+                    | Q(created=post.pub_date, id__gt=0)
+                ).order_by('created', 'id'),
+                'comment_post_created_idx'),
+            'post': (
+                Post.objects.for_feed().filter(
+                    id=post.id, author__username=post.author.username
+                ).order_by(),
+                'INTEGER PRIMARY KEY'),
+        }
+        for name, (queryset, index) in queries.items():
+            with self.subTest(name=name):
+                plan = query_plan(queryset[:11])
+                self.assertTrue(
+                    any(index in step for step in plan), plan)
+                self.assertFalse(
+                    any('TEMP B-TREE' in step for step in plan), plan)
+                self.assertFalse(
+                    any(step.startswith('SCAN') and 'INDEX' not in step
+                        for step in plan), plan)
@@ -0,0 +1,134 @@
+import copy
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Follow, Post
+from sorl.thumbnail.models import KVStore
+from yatube.routers import ReplicaRouter
+
+# python manage.py test posts.tests.test_replicas -v 0
+
+User = get_user_model()
+
+PIN_COOKIE = settings.REPLICA_PIN_COOKIE
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Реплика - копия базы в файле, которая отстает, пока ее не обновит
+    sync_replicas. TransactionTestCase: backup API копирует только
+    завершенные транзакции.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = copy.deepcopy(connections.databases['default'])
+        config['NAME'] = os.path.join(directory.name, 'replica.sqlite3')
+        connections.databases['replica'] = config
+        self.addCleanup(self.remove_replica)
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=self.author, text='Пост до копирования')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.guest_client = Client()
+        self.sync()
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def sync(self):
+        call_command('sync_replicas', stdout=StringIO())
+
+    def test_pages_read_from_replica(self):
+        """Страницы читают реплику и видят данные с отставанием"""
+        post = Post.objects.create(author=self.author, text='Свежий пост')
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Пост до копирования')
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+        # пост еще не доехал до реплики
+        post_url = reverse('post', args=['author', post.pk])
+        self.assertEqual(self.guest_client.get(post_url).status_code, 404)
+        self.sync()
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Свежий пост')
+        self.assertEqual(self.guest_client.get(post_url).status_code, 200)
+
+    def test_read_your_writes(self):
+        """После своей записи автор читает default, остальные - реплику"""
+        response = self.author_client.post(
+            reverse('new_post'), {'text': 'Мой новый пост'})
+        self.assertEqual(response.status_code, 302)
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+        # гость первым кладет в кеш ленту из отстающей реплики
+        self.assertNotContains(
+            self.guest_client.get(reverse('index')), 'Мой новый пост')
+        for url in (reverse('index'), reverse('profile', args=['author'])):
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.author_client.get(url), 'Мой новый пост')
+        # cookie истекла: автор снова читает реплику
+        del self.author_client.cookies[PIN_COOKIE]
+        self.assertNotContains(
+            self.author_client.get(reverse('index')), 'Мой новый пост')
+        self.sync()
+        self.assertContains(
+            self.guest_client.get(reverse('index')), 'Мой новый пост')
+
+    def test_writes_in_get_pin_to_primary(self):
+        """Подписка по GET тоже привязывает пользователя к default"""
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.get(
+            reverse('profile_follow', args=['author']))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        profile = reader_client.get(reverse('profile', args=['author']))
+        self.assertTrue(profile.context['following'])
+
+    def test_new_session_read_from_primary(self):
+        """Вошедший после копирования не разлогинен на странице реплики"""
+        newcomer = User.objects.create_user(username='newcomer')
+        client = Client()
+        client.force_login(newcomer)
+        # ни сессии, ни пользователя в кеше: читаются из базы
+        cache.clear()
+        response = client.get(reverse('index'))
+        self.assertNotIn(PIN_COOKIE, client.cookies)
+        self.assertEqual(response.context['user'], newcomer)
+
+    def test_router(self):
+        """Запись - только в default, миграции реплике не нужны"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_write(KVStore), 'default')
+        self.assertIsNone(router.db_for_read(Post))
+        for model in (User, Session, KVStore):
+            with self.subTest(model=model):
+                self.assertEqual(router.db_for_read(model), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+        # запросы не из REPLICA_VIEWS реплику не трогают
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.author_client.get(reverse('new_post'))
+        self.assertEqual(len(replica), 0)
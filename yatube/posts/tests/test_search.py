@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+# python manage.py test posts.tests.test_search -v 0
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Проверка поиска по индексу FTS5"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.rammstein = Post.objects.create(
+            text='Rammstein Rammstein Rammstein', author=cls.author)
+        cls.mention = Post.objects.create(
+            text='Слушаю Rammstein и пишу пост про Берлин',
+            author=cls.author)
+        cls.other = Post.objects.create(
+            text='Пост совсем о другом', author=cls.author)
+        cls.superuser = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='1234567')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('search'), {'q': query, **params})
+        return response, list(response.context['page'])
+
+    def test_search_ranks_results(self):
+        """Находит посты по словам, релевантные - первыми"""
+        response, posts = self.search('rammstein')
+        self.assertEqual(posts, [self.rammstein, self.mention])
+        response, posts = self.search('БЕРЛИН rammstein')
+        self.assertEqual(posts, [self.mention])
+        response, posts = self.search('"(*')
+        self.assertEqual(posts, [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        # меняем посты через queryset: объекты класса общие для тестов
+        Post.objects.filter(pk=self.other.pk).update(
+            text='теперь и тут Берлин')
+        self.assertEqual(self.search('берлин')[1],
+                         [self.other, self.mention])
+        Post.objects.filter(pk=self.mention.pk).delete()
+        self.assertEqual(self.search('берлин')[1], [self.other])
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_search_cursor_pagination(self):
+        """Курсор ведет на следующую страницу того же запроса"""
+        response, posts = self.search('rammstein')
+        self.assertEqual(posts, [self.rammstein])
+        page = response.context['page']
+        self.assertContains(response, 'q=rammstein&amp;cursor=')
+        response, posts = self.search('rammstein', cursor=page.next_cursor)
+        self.assertEqual(posts, [self.mention])
+        page = response.context['page']
+        response, posts = self.search(
+            'rammstein', cursor=page.previous_cursor)
+        self.assertEqual(posts, [self.rammstein])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет через индекс"""
+        client = Client()
+        client.force_login(self.superuser)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'берлин'})
+        self.assertEqual(
+            list(response.context['cl'].queryset), [self.mention])
+        self.assertIn('posts_post_fts', str(
+            response.context['cl'].queryset.query))
@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from yatube.sqlite.base import DatabaseWrapper
+
+# python manage.py test posts.tests.test_sqlite -v 0
+
+
+def make_wrapper(path, **options):
+    config = dict(settings.DATABASES['default'], NAME=path)
+    config['OPTIONS'] = dict(config['OPTIONS'], **options)
+    config.setdefault('TIME_ZONE', None)
+    return DatabaseWrapper(config, 'sqlite_test')
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    """Настроенный бэкенд выполняет PRAGMA и берет запись сразу"""
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """PRAGMA из OPTIONS выполнены на новом соединении"""
+        wrapper = make_wrapper(self.path)
+        self.addCleanup(wrapper.close)
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        # 1 - NORMAL
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -64000)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 20000)
+
+    def test_atomic_takes_write_lock(self):
+        """atomic() начинается с BEGIN IMMEDIATE: второй писатель ждет"""
+        wrapper = make_wrapper(self.path)
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        wrapper.set_autocommit(False)
+        wrapper._start_transaction_under_autocommit()
+        # ни одной записи еще не было, но блокировка уже взята
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        wrapper.rollback()
+        wrapper.set_autocommit(True)
+
+    def test_invalid_options(self):
+        """Значения PRAGMA и режим транзакций проверяются"""
+        wrapper = make_wrapper(
+            self.path, pragmas={'cache_size': '1; DROP TABLE x'})
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.ensure_connection()
+        wrapper = make_wrapper(self.path, transaction_mode='LAZY')
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.transaction_mode
+
+
+class BenchmarkSQLiteTest(TransactionTestCase):
+    """Замер профилей базы отдает отчет и не трогает основную базу"""
+    # копия базы делается backup API, а он ждет конца открытой
+    # транзакции, в которой TestCase держит каждый тест
+    def setUp(self):
+        call_command('generate_dataset', users=10, groups=2, posts=30,
+                     comments=10, follows=3, stdout=StringIO())
+
+    def test_report(self):
+        """Оба профиля успели поработать, default вернулся на место"""
+        before = connection.settings_dict['NAME']
+        output = StringIO()
+        call_command('benchmark_sqlite', processes=2, seconds=0.3,
+                     write_ratio=0.5, json=True, stdout=output)
+        report = json.loads(output.getvalue())
+        profiles = {row['profile']: row for row in report['results']}
+        self.assertEqual(set(profiles), {'stock', 'tuned'})
+        self.assertEqual(profiles['tuned']['engine'], 'yatube.sqlite')
+        for row in profiles.values():
+            with self.subTest(profile=row['profile']):
+                self.assertGreater(row['reads_per_s'], 0)
+                self.assertGreater(row['writes_per_s'], 0)
+        self.assertEqual(connection.settings_dict['NAME'], before)
@@ -0,0 +1,193 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.cache import feed_version
+from posts.kvstore import TieredKVStore
+from posts.models import Post
+from posts.thumbnails import (
+    THUMBNAIL_SPECS, _generate_and_refresh, _pending, backend,
+    generate_thumbnails, schedule_thumbnails)
+from sorl.thumbnail import default
+
+# python manage.py test posts.tests.test_thumbnails -v 0
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.MEDIA_ROOT),
+                   THUMBNAIL_ASYNC=False)
+class ThumbnailTest(TestCase):
+    """Миниатюры создаются заранее, шаблон их не ждет"""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+        self.post = Post.objects.create(
+            text='пост с картинкой',
+            author=self.author,
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'))
+        self.guest_client = Client()
+        cache.clear()
+        # память процесса переживает откат базы между тестами
+        TieredKVStore.local.clear()
+
+    def cached(self):
+        geometry, options = THUMBNAIL_SPECS['feed']
+        return backend.get_cached_thumbnail(
+            self.post.image, geometry, **options)
+
+    # с пулом: транзакция теста не фиксируется, и пул ничего не получит
+    @override_settings(THUMBNAIL_ASYNC=True)
+    def test_page_shows_placeholder_until_thumbnail_ready(self):
+        """Без миниатюры - заглушка, после генерации - картинка"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'padding-top: 35.3%')
+        self.assertNotContains(response, '<img class="card-img"')
+        # запрос не создал миниатюру сам
+        self.assertIsNone(self.cached())
+        self.assertTrue(generate_thumbnails(self.post.image.name))
+        cache.clear()
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(
+            response, f'<img class="card-img" src="{self.cached().url}"')
+        # все варианты для srcset созданы вместе с основной миниатюрой
+        self.assertRegex(
+            response.content.decode(),
+            r'srcset="\S+ 480w, \S+ 960w, \S+ 1440w"')
+
+    def test_schedule_thumbnails(self):
+        """Без пула миниатюры создаются сразу, даже внутри транзакции"""
+        schedule_thumbnails(self.post.image.name)
+        self.assertIsNotNone(self.cached())
+        self.assertNotIn(self.post.image.name, _pending)
+        # транзакция теста не фиксируется: в очередь ничего не попало
+        with override_settings(THUMBNAIL_ASYNC=True):
+            schedule_thumbnails(self.post.image.name)
+        self.assertNotIn(self.post.image.name, _pending)
+
+    def test_ready_thumbnail_resets_only_its_pages(self):
+        """Готовая миниатюра сбрасывает страницы своего поста, а не все"""
+        other = Post.objects.create(text='без картинки', author=self.author)
+        reset = [
+            reverse('post', args=[self.author.username, self.post.pk]),
+            reverse('profile', args=[self.author.username]),
+        ]
+        kept = [
+            reverse('index'),
+            reverse('post', args=[self.author.username, other.pk]),
+        ]
+        for url in reset + kept:
+            self.guest_client.get(url)
+        version = feed_version()
+        _generate_and_refresh(self.post.image.name)
+        self.assertEqual(feed_version(), version)
+        for url in reset:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.guest_client.get(url).context)
+        for url in kept:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url)
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails создает миниатюры всех постов"""
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+        self.assertIsNotNone(self.cached())
+        call_command('generate_thumbnails', workers=1, force=True,
+                     stdout=StringIO())
+        self.assertIsNotNone(self.cached())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.MEDIA_ROOT),
+                   THUMBNAIL_ASYNC=False)
+class ThumbnailStoreTest(TestCase):
+    """Миниатюры страницы ищутся пачкой, лишние файлы убирает сборщик"""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+        self.posts = [
+            Post.objects.create(
+                text=f'пост {number}', author=self.author,
+                image=SimpleUploadedFile(
+                    name='small.gif', content=SMALL_GIF + bytes([number]),
+                    content_type='image/gif'))
+            for number in range(3)
+        ]
+        for post in self.posts:
+            generate_thumbnails(post.image.name)
+        self.guest_client = Client()
+        cache.clear()
+        TieredKVStore.local.clear()
+
+    def kvstore_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.guest_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        return [query for query in captured
+                if 'thumbnail_kvstore' in query['sql']]
+
+    def test_page_resolved_in_batch(self):
+        """Одна выборка из KV store на страницу, потом - ни одной"""
+        self.assertEqual(len(self.kvstore_queries()), 1)
+        cache.clear()
+        self.assertEqual(len(self.kvstore_queries()), 0)
+
+    def test_gc_removes_orphans(self):
+        """Сборщик удаляет миниатюры удаленных постов и только их"""
+        gone = self.posts.pop()
+        orphans = [backend.thumbnail_file(gone.image, geometry, **options)
+                   for geometry, options in THUMBNAIL_SPECS.values()]
+        gone.delete()
+        call_command('gc_thumbnails', min_age=0, stdout=StringIO())
+        for thumbnail in orphans:
+            self.assertFalse(thumbnail.exists())
+            self.assertIsNone(default.kvstore.get(thumbnail))
+        for post in self.posts:
+            for geometry, options in THUMBNAIL_SPECS.values():
+                self.assertTrue(backend.thumbnail_file(
+                    post.image, geometry, **options).exists())
+
+    def test_gc_in_batches(self):
+        """Пачки по одному файлу: нужные миниатюры остаются"""
+        gone = self.posts.pop()
+        orphans = [backend.thumbnail_file(gone.image, geometry, **options)
+                   for geometry, options in THUMBNAIL_SPECS.values()]
+        gone.delete()
+        output = StringIO()
+        call_command('gc_thumbnails', min_age=0, batch_size=1,
+                     stdout=output)
+        for thumbnail in orphans:
+            self.assertFalse(thumbnail.exists())
+        for post in self.posts:
+            for geometry, options in THUMBNAIL_SPECS.values():
+                self.assertTrue(backend.thumbnail_file(
+                    post.image, geometry, **options).exists())
+        self.assertIn(f'Удалено: {len(orphans)} ', output.getvalue())
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Follow, Post, Timeline
+
+# python manage.py test posts.tests.test_timeline -v 0
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    """Проверка готовой ленты подписок"""
+    def setUp(self):
+        self.author = User.objects.create_user(username='Pascha')
+        self.reader = User.objects.create_user(username='Гарри')
+        self.old_post = Post.objects.create(
+            text='пост до подписки', author=self.author)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def timeline(self):
+        return list(Timeline.objects.filter(
+            user=self.reader).values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_new_post_fans_out(self):
+        """Подписка добавляет старые посты, новый пост - сам себя"""
+        self.authorized_client.get(reverse(
+            'profile_follow', args={self.author.username}))
+        self.assertEqual(self.timeline(), [self.old_post.id])
+        new_post = Post.objects.create(
+            text='пост после подписки', author=self.author)
+        self.assertEqual(self.timeline(), [new_post.id, self.old_post.id])
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [new_post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.authorized_client.get(reverse(
+            'profile_unfollow', args={self.author.username}))
+        self.assertEqual(self.timeline(), [])
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 0)
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Timeline.objects.all().delete()
+        # строка ленты без подписки должна исчезнуть
+        Timeline.objects.create(
+            user=self.author, post=self.old_post,
+            author=self.author, pub_date=self.old_post.pub_date)
+        call_command('rebuild_timelines', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.id])
+        self.assertEqual(Timeline.objects.count(), 1)
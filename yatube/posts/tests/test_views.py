@@ -8,7 +8,9 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django import forms
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from posts.models import Group, Post, Comment, Follow
 
@@ -85,7 +87,9 @@ class TemplateTest(TestCase):
         self.assertEqual(value.group, post.group)
         self.assertEqual(value.author, post.author)
         self.assertEqual(value.pub_date.date(), dt.date.today())
-        self.assertEqual(value.image, 'posts/small.gif')
+        # имя файла - SHA-256 содержимого (posts/storage.py)
+        self.assertRegex(
+            value.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{62}\.gif$')
 
     def test_pages_use_correct_template(self):
         """View функции используют соответствующие шаблоны."""
@@ -352,7 +356,10 @@ class TemplateTest(TestCase):
 
     def test_home_page_cache(self):
         """Проверка кеширования главной страницы"""
-        response = self.authorized_client.get(reverse('index'))
+        # целиком кешируется страница гостей; у вошедших ETag и фрагмент
+        # ленты сразу меняет новый пост (ConditionalGetTest)
+        guest_client = Client()
+        response = guest_client.get(reverse('index'))
         first_request = response.content
         # создаем новый пост
         form_data = {'text': 'пост проверяющий кеш'}
@@ -360,10 +367,290 @@ class TemplateTest(TestCase):
             reverse('new_post'),
             data=form_data,
             follow=True)
-        response = self.authorized_client.get(reverse('index'))
+        response = guest_client.get(reverse('index'))
         # проверяем, что новый пост не сразу появился на главной странице
         self.assertEqual(first_request, response.content)
         cache.clear()
         # cache.clear() вместо time.sleep(20), чтобы не ждать по 20 сек
-        response = self.authorized_client.get(reverse('index'))
+        response = guest_client.get(reverse('index'))
         self.assertNotEqual(first_request, response.content)
+
+
+class QueryCountTest(TestCase):
+    """
+    Число запросов страниц не зависит от числа постов:
+    карточка поста не должна ходить в базу сама (N+1)
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.reader = User.objects.create_user(username='Гарри')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовый текст')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        # постов больше, чем помещается на страницу, у каждого комментарий
+        for number in range(12):
+            cls.post = Post.objects.create(
+                text=f'пост {number}', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='комментарий')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryCountTest.reader)
+        cache.clear()
+        # сессия и пользователь попадают в кеш на первой же странице
+        self.authorized_client.get(reverse('about:author'))
+
+    def test_pages_query_count(self):
+        """Страницы с карточками постов делают фиксированное число запросов"""
+        author = QueryCountTest.author
+        pages_queries = {
+            reverse('index'): 2,
+            reverse('group', kwargs={'slug': QueryCountTest.group.slug}): 3,
+            reverse('profile', kwargs={'username': author.username}): 4,
+            reverse('post', kwargs={
+                'username': author.username,
+                'post_id': QueryCountTest.post.id}): 2,
+            reverse('follow_index'): 2,
+        }
+        for url, queries in pages_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.authorized_client.get(url)
+                self.assertContains(response, 'Комментариев: 1')
+
+
+class FeedCacheTest(TestCase):
+    """Проверка кеша фрагментов лент"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовый текст')
+        for number in range(13):
+            cls.post = Post.objects.create(
+                text=f'пост номер {number}',
+                author=cls.author,
+                group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.user = User.objects.create_user(username='Гарри')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(FeedCacheTest.author)
+        cache.clear()
+
+    def feed_urls(self):
+        return (
+            reverse('index'),
+            reverse('group', kwargs={'slug': FeedCacheTest.group.slug}),
+            reverse('profile', kwargs={
+                'username': FeedCacheTest.author.username}),
+        )
+
+    def test_pages_are_cached_separately(self):
+        """Вторая страница ленты не отдается из кеша первой"""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                second = self.guest_client.get(url, {'page': 2})
+                self.assertContains(first, 'пост номер 12')
+                self.assertNotContains(second, 'пост номер 12')
+                self.assertContains(second, 'пост номер 0')
+
+    def test_edit_link_does_not_leak(self):
+        """Ссылка "Редактировать" видна только автору"""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.author_client.get(url), 'Редактировать')
+                self.assertNotContains(
+                    self.authorized_client.get(url), 'Редактировать')
+                self.assertNotContains(
+                    self.guest_client.get(url), 'Редактировать')
+                self.assertContains(
+                    self.author_client.get(url), 'Редактировать')
+
+    def test_guests_and_readers_share_fragment(self):
+        """Гости и читатели без постов на странице делят один фрагмент"""
+        url = reverse('index')
+        guest_key = self.guest_client.get(url).context['feed_cache_key']
+        reader_key = self.authorized_client.get(
+            url).context['feed_cache_key']
+        author_key = self.author_client.get(url).context['feed_cache_key']
+        self.assertEqual(guest_key, reader_key)
+        self.assertNotEqual(guest_key, author_key)
+
+    def test_edit_invalidates_feeds(self):
+        """Отредактированный пост сразу виден в ленте"""
+        url = reverse('index')
+        self.guest_client.get(url)
+        self.author_client.post(
+            reverse('edit', kwargs={
+                'username': FeedCacheTest.author.username,
+                'post_id': FeedCacheTest.post.id}),
+            data={'text': 'исправленный текст'})
+        self.assertContains(self.guest_client.get(url), 'исправленный текст')
+
+
+class ConditionalGetTest(TestCase):
+    """Неизменившиеся страницы отдаются ответом 304 без шаблона"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.reader = User.objects.create_user(username='Гарри')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовый текст')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTest.reader)
+        cache.clear()
+
+    def urls(self):
+        author = ConditionalGetTest.author
+        return (
+            reverse('index'),
+            reverse('group', kwargs={'slug': ConditionalGetTest.group.slug}),
+            reverse('profile', kwargs={'username': author.username}),
+            reverse('post', kwargs={
+                'username': author.username,
+                'post_id': ConditionalGetTest.post.id}),
+            reverse('follow_index'),
+        )
+
+    def test_unchanged_page_is_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304 без рендеринга"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response.templates, [])
+
+    def test_etag_depends_on_viewer(self):
+        """Гость и пользователь видят разную шапку - и разные ETag"""
+        url = reverse('index')
+        self.assertNotEqual(self.guest_client.get(url)['ETag'],
+                            self.reader_client.get(url)['ETag'])
+
+    def test_changes_update_etag(self):
+        """Комментарий, правка и новый пост меняют ETag"""
+        url = self.urls()[3]
+        etag = self.reader_client.get(url)['ETag']
+        Comment.objects.create(post=ConditionalGetTest.post,
+                               author=ConditionalGetTest.reader, text='да')
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментариев: 1')
+
+        url = reverse('index')
+        etag = self.reader_client.get(url)['ETag']
+        ConditionalGetTest.post.text = 'исправленный текст'
+        ConditionalGetTest.post.save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'исправленный текст')
+
+        # новый пост меняет валидаторы всех его лент сразу, без
+        # истечения кеша
+        index, group, profile, _, follow = self.urls()
+        etags = {
+            url: self.reader_client.get(url)['ETag']
+            for url in (index, group, profile, follow)
+        }
+        Post.objects.create(text='новый пост',
+                            author=ConditionalGetTest.author,
+                            group=ConditionalGetTest.group)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'новый пост')
+
+    def test_group_edit_updates_etag(self):
+        """Правка группы видна в карточках постов всех лент"""
+        url = reverse('index')
+        etag = self.reader_client.get(url)['ETag']
+        ConditionalGetTest.group.title = 'Новое название'
+        ConditionalGetTest.group.save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новое название')
+
+    def test_validators_in_one_query(self):
+        """Дата последнего поста и число постов - одним запросом"""
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(reverse('index'))
+        aggregates = [query['sql'] for query in queries
+                      if 'COUNT(' in query['sql'] or 'MAX(' in query['sql']]
+        self.assertEqual(len(aggregates), 1)
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPagesTest(TestCase):
+    """Комментарии страницами по курсору и фрагментом "Показать еще" """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Pascha')
+        cls.post = Post.objects.create(text='пост', author=cls.author)
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{number}'),
+                text=f'комментарий {number}')
+            for number in range(12)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_pages_in_order(self):
+        """Первая страница на посте, остальные фрагментами, по порядку"""
+        post = CommentPagesTest.post
+        response = self.guest_client.get(reverse('post', kwargs={
+            'username': post.author.username, 'post_id': post.id}))
+        page = response.context['comments']
+        seen = [comment.pk for comment in page]
+        self.assertEqual(len(seen), 5)
+        while page.has_next():
+            self.assertContains(response, page.next_cursor)
+            response = self.guest_client.get(
+                reverse('post_comments', kwargs={
+                    'username': post.author.username, 'post_id': post.id}),
+                {'cursor': page.next_cursor})
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            self.assertNotContains(response, '<html')
+            page = response.context['comments']
+            seen += [comment.pk for comment in page]
+        self.assertEqual(
+            seen, [comment.pk for comment in CommentPagesTest.comments])
+
+    def test_first_paint_constant(self):
+        """Число запросов страницы поста не зависит от числа комментариев"""
+        post = CommentPagesTest.post
+        url = reverse('post', kwargs={
+            'username': post.author.username, 'post_id': post.id})
+        # пост, комментарии с авторами, версия лент не из базы
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(url)
+        self.assertContains(response, 'Показать еще комментарии')
@@ -0,0 +1,163 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . cache import bump_post_versions
+from . models import Post
+from . storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+# Все миниатюры, которые показывают шаблоны: имя -> (размер, параметры).
+# По этому списку миниатюры готовятся заранее, а не при первом показе.
+THUMBNAIL_SPECS = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+    'feed-480': ('480x170', {'crop': 'center', 'upscale': True}),
+    'feed-1440': ('1440x509', {'crop': 'center', 'upscale': True}),
+}
+# варианты одной миниатюры разной ширины для srcset
+THUMBNAIL_SRCSETS = {
+    'feed': ('feed-480', 'feed', 'feed-1440'),
+}
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который умеет только заглянуть в KV store,
+    ничего не создавая: шаблон не должен ждать PIL.
+    """
+
+    def get_options(self, source, options):
+        'Дополняет параметры так же, как ThumbnailBackend.get_thumbnail().'
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        'ImageFile миниатюры (возможно, еще не созданной).'
+        source = ImageFile(file_)
+        options = self.get_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        'Готовая миниатюра или None, если её еще не сделали.'
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+    def generate(self, file_, geometry_string, force=False, **options):
+        'Создает миниатюру; force пересоздает уже существующую.'
+        if force:
+            source = ImageFile(file_)
+            name = self._get_thumbnail_filename(
+                source, geometry_string, self.get_options(source, options))
+            thumbnail = ImageFile(name, default.storage)
+            default.kvstore.delete(thumbnail, delete_thumbnails=False)
+            thumbnail.delete()
+        return self.get_thumbnail(file_, geometry_string, **options)
+
+
+backend = PostThumbnailBackend()
+
+
+def prefetch_thumbnails(images):
+    """
+    Ищет все миниатюры из THUMBNAIL_SPECS для картинок страницы разом:
+    KV store (posts/kvstore.py) запоминает найденные в процессе, и
+    {% post_thumbnail %} каждой карточки уже не ходит в кеш и базу.
+    """
+    thumbnails = [
+        backend.thumbnail_file(image, geometry, **options)
+        for image in images if image
+        for geometry, options in THUMBNAIL_SPECS.values()
+    ]
+    if thumbnails:
+        default.kvstore.get_many(thumbnails)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# имена картинок, миниатюры которых уже в очереди
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def generate_thumbnails(name, force=False):
+    'Создает все миниатюры из THUMBNAIL_SPECS для картинки name.'
+    # хранилище входит в ключ миниатюры: без него sorl взял бы
+    # default_storage, и шаблон не нашел бы готовые миниатюры
+    source = ImageFile(name, post_image_storage)
+    try:
+        for geometry, options in THUMBNAIL_SPECS.values():
+            backend.generate(source, geometry, force=force, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return False
+    finally:
+        _pending.discard(name)
+    return True
+
+
+def _generate_and_refresh(name):
+    # заглушка вместо картинки устарела только у постов с этой картинкой:
+    # их версии входят в ключи фрагментов, ETag и страниц гостей. Общая
+    # лента гостей обновится с истечением кеша
+    if generate_thumbnails(name):
+        bump_post_versions(
+            Post.objects.filter(image=name).values_list('pk', flat=True))
+
+
+def _run_in_worker(name):
+    try:
+        _generate_and_refresh(name)
+    finally:
+        # поток пула живет дольше запроса, соединение с базой за ним
+        connections.close_all()
+
+
+def _submit(name):
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    get_executor().submit(_run_in_worker, name)
+
+
+def schedule_thumbnails(name):
+    """
+    Ставит миниатюры картинки в очередь пула после фиксации транзакции.
+    При THUMBNAIL_ASYNC = False создает их сразу (удобно в тестах).
+    """
+    if not name:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        _generate_and_refresh(name)
+        return
+    # в _pending имя попадает только после фиксации: при откате
+    # транзакции оно не застрянет там навсегда
+    transaction.on_commit(lambda: _submit(name))
@@ -8,11 +8,16 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group'),
     #  <slug:slug>/ тип данных:название
     path('new/', views.new_post, name='new_post'),
+    # Поиск (до профайла, иначе search/ примется за имя пользователя)
+    path('search/', views.search, name='search'),
     # Профайл пользователя
     path('<str:username>/', views.profile, name='profile'),
     # Просмотр записи
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit, name='edit'),
+    # Следующие комментарии фрагментом страницы
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     # Добавление комментария
     path('<username>/<int:post_id>/comment', views.add_comment,
          name='add_comment'),
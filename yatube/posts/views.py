@@ -1,11 +1,21 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-# from django.views.decorators.cache import cache_page
+from django.db import transaction
+from django.db.models import Count, Max
 
-from . models import Post, Group, Follow
+from . models import Post, Group, Follow, Timeline
 from . forms import PostForm, CommentForm
+from . paginators import CursorPaginator
+from . cache import feed_cache_context, feed_version
+from . conditional import cache_guest_page, render_conditional
+from . counters import get_counters
+from . search import SearchPaginator, fts_available
+from . thumbnails import schedule_thumbnails
 
 User = get_user_model()
 
@@ -28,34 +38,96 @@ User = get_user_model()
 # python manage.py test
 
 
-# @cache_page(20) # таким образм кешируется вся функция и
-# вся странца, луче в шаблоне index закешировать блок с
-# постами, чтобы верхнее меню отображалось онлайн
+def get_page(request, post_list, ordering=('-pub_date', '-id'), rows=None):
+    """
+    Возвращает страницу ленты: по номеру или по курсору (keyset).
+
+    Дата последнего поста и число постов - валидаторы ленты
+    (feed_cache_context) - приходят одним запросом по индексу строк
+    ленты rows (по умолчанию - самих постов); тот же запрос дает
+    паджинатору число постов. По курсору число постов не считается:
+    эта паджинация обходится без COUNT(*).
+    """
+    if rows is None:
+        rows = post_list
+    if settings.CURSOR_PAGINATION:
+        stats = rows.aggregate(latest=Max('pub_date'))
+        page = get_cursor_page(request, post_list, ordering)
+    else:
+        stats = rows.aggregate(latest=Max('pub_date'), total=Count('id'))
+        # Показывать по 10 записей на странице.
+        paginator = Paginator(
+            post_list.order_by(*ordering), settings.POSTS_PER_PAGE)
+        paginator.count = stats['total']
+        # Из URL извлекаем номер запрошенной страницы - значение page
+        page = paginator.get_page(request.GET.get('page'))
+    page.latest = stats['latest']
+    return page
+
+
+def get_cursor_page(request, post_list, ordering):
+    paginator = CursorPaginator(post_list, settings.POSTS_PER_PAGE, ordering)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_page(cursor)
+    # Старые ссылки ?page=N работают для первых нескольких страниц
+    try:
+        number = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        number = 1
+    if 1 < number <= settings.CURSOR_PAGINATION_LEGACY_PAGES:
+        return paginator.get_numbered_page(number)
+    return paginator.get_page()
+
+
+# cache_page кешировал бы и шапку с меню вошедшего пользователя, поэтому
+# целиком кешируются только страницы гостей, а у вошедших - блок с
+# постами в шаблоне, верхнее меню отображается онлайн
+@cache_guest_page()
 def index(request):
-    post_list = Post.objects.all()
-    # Показывать по 10 записей на странице.
-    paginator = Paginator(post_list, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
-    return render(
+    post_list = Post.objects.for_feed()
+    # Получаем набор записей для запрошенной страницы
+    page = get_page(request, post_list)
+    feed = feed_cache_context(request, 'index', page)
+    return render_conditional(
         request,
         'index.html',
-        {'page': page, }
+        {'page': page, **feed},
+        [feed['feed_cache_key']],
     )
 
 
+@cache_guest_page(group='slug')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.for_feed()
+    page = get_page(request, posts)
     # # раньше была запись posts = Post.objects.filter(group=group)[:12]
-    return render(request, 'group.html', {
+    feed = feed_cache_context(request, f'group:{group.pk}', page)
+    return render_conditional(request, 'group.html', {
         'group': group,
         'page': page,
+        **feed,
+    }, [feed['feed_cache_key'], group.title, group.description])
+
+
+def search(request):
+    'Поиск по тексту постов, самые релевантные - первыми.'
+    query = request.GET.get('q', '').strip()
+    if fts_available():
+        paginator = SearchPaginator(query, settings.POSTS_PER_PAGE)
+        page = paginator.get_page(request.GET.get('cursor'))
+    else:
+        posts = Post.objects.for_feed().filter(text__icontains=query)
+        if not query:
+            posts = posts.none()
+        paginator = CursorPaginator(posts, settings.POSTS_PER_PAGE)
+        page = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'search.html', {
+        'query': query,
+        'page': page,
+        # курсорные ссылки паджинатора не должны терять запрос
+        'pagination_query': urlencode({'q': query}) + '&',
     })
 
 
@@ -65,7 +137,12 @@ def new_post(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        # сигналы обновляют ленты и счетчики в той же транзакции
+        with transaction.atomic():
+            post.save()
+            # миниатюры создаст пул потоков, а не первый зритель
+            if post.image:
+                schedule_thumbnails(post.image.name)
         return redirect('index')
 
     return render(request, 'new_post.html', {'form': form})
@@ -83,7 +160,11 @@ def post_edit(request, username, post_id):
             data=request.POST or None
         )
         if form.is_valid():
-            post.save()
+            # comments_count меняют сигналы через F(): не перезаписываем
+            # его значением, прочитанным в начале запроса
+            post.save(update_fields=PostForm.Meta.fields)
+            if 'image' in form.changed_data and post.image:
+                schedule_thumbnails(post.image.name)
             return redirect('post', username=username, post_id=post_id)
         return render(
             request,
@@ -93,40 +174,76 @@ def post_edit(request, username, post_id):
     return redirect('post', username=post.author.username, post_id=post_id)
 
 
+@cache_guest_page(author='username', profile='username')
 def profile(request, username):
     'Отображает страницу пользователя с его постами и информацией.'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    posts = author.posts.for_feed()
+    page = get_page(request, posts)
     # Подписан ли пользователь
     is_following = False
     if request.user.is_authenticated:
         if author.following.filter(user=request.user).exists():
             is_following = True
-    return render(request, 'profile.html', {
+    counters = get_counters(author)
+    feed = feed_cache_context(request, f'profile:{author.pk}', page)
+    return render_conditional(request, 'profile.html', {
         'author': author,
         'page': page,
         'following': is_following,
-    })
+        'counters': counters,
+        **feed,
+    }, [feed['feed_cache_key'], is_following, author.get_full_name(),
+        counters.posts_count, counters.following_count,
+        counters.followers_count])
 
 
+def comments_page(request, post):
+    'Страница комментариев по порядку написания, по курсору (keyset).'
+    # автор каждого комментария приходит тем же запросом
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE, ('created', 'id'))
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@cache_guest_page(post='post_id', author='username')
 def post_view(request, username, post_id):
-    'Отображает страницу с отдельным постом и комментариями.'
+    'Отображает страницу с отдельным постом и первыми комментариями.'
     # # Количество постов есть в author через related_name.
     # Смотри 'author.posts.count()' в шаблоне post.html
     # author__username=username - это обращение к полю связанной модели(__)
-    post = get_object_or_404(Post, id=post_id, author__username=username)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__counters'),
+        id=post_id, author__username=username)
+    comments = comments_page(request, post)
     author = post.author
+    counters = get_counters(author)
     form = CommentForm()
-    return render(request, 'post.html', {
+    # правки поста меняют версию лент, новые комментарии - их счетчик
+    return render_conditional(request, 'post.html', {
         'author': author,
         'post': post,
+        'counters': counters,
         'comments': comments,
         'form': form,
-    })
+    }, [feed_version(), post.pk, post.comments_count,
+        request.GET.get('cursor'), author.get_full_name(),
+        counters.posts_count, counters.following_count,
+        counters.followers_count])
+
+
+def post_comments(request, username, post_id):
+    'Следующие комментарии поста фрагментом HTML для кнопки "Показать еще".'
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        id=post_id, author__username=username)
+    return render_conditional(request, 'includes/comment_list.html', {
+        'author': post.author,
+        'post': post,
+        'comments': comments_page(request, post),
+    }, [post.pk, post.comments_count, request.GET.get('cursor')])
 
 
 def add_comment(request, username, post_id):
@@ -138,7 +255,8 @@ def add_comment(request, username, post_id):
             comment = form.save(commit=False)
             comment.author = request.user
             comment.post = post
-            comment.save()
+            with transaction.atomic():
+                comment.save()
     return redirect('post', username=username, post_id=post_id)
 
 
@@ -162,11 +280,19 @@ def server_error(request):
 @login_required
 def follow_index(request):
     'Выводит посты авторов на которых подписан пользователь.'
-    posts_follow = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts_follow, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'follow.html', {'page': page})
+    # Посты берем из готовой ленты (Timeline), которую заполняет
+    # публикация поста, а не соединяем посты с подписками на лету
+    posts_follow = Post.objects.for_feed().timeline(request.user)
+    page = get_page(request, posts_follow, Post.TIMELINE_ORDERING,
+                    Timeline.objects.filter(user=request.user))
+    # лента подписок у каждого своя, поэтому и ключ кеша свой. Подписка
+    # добавляет в нее старые посты, их дата ленты не меняет
+    feed = feed_cache_context(request, f'follow:{request.user.pk}', page,
+                              [('follow', request.user.pk)])
+    return render_conditional(request, 'follow.html', {
+        'page': page,
+        **feed,
+    }, [feed['feed_cache_key']])
 
 
 @login_required
@@ -175,7 +301,8 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(user=request.user, author=author).exists()
     if request.user != author and follow is False:
-        Follow.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.create(user=request.user, author=author)
         return redirect('profile', username=username)
     return redirect('profile', username=username)
 
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # подключаем обработчики сигналов (кеш пользователей)
+        from . import signals  # noqa: F401
@@ -0,0 +1,107 @@
+"""
+Пользователь запроса из кеша.
+
+Штатный AuthenticationMiddleware на каждой странице читает auth_user из
+базы. Здесь pk, имя, флаги доступа (CACHED_FIELDS) и хеш сессии
+пользователя хранятся в кеше
+USER_CACHE_TIMEOUT секунд под ключом с версией, которую меняет любое
+сохранение (users/signals.py): смена пароля меняет хеш сессии, и старые
+сессии выходят из аккаунта сразу.
+Проверки сессии те же, что в django.contrib.auth.get_user.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from posts.cache import bump_version, get_version
+from yatube.routers import use_primary
+
+
+# поля, которые читают шаблоны, админка и проверки прав: без них каждое
+# обращение к отложенному полю было бы отдельным запросом
+CACHED_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def user_version_key(user_id):
+    return f'users:version:{user_id}'
+
+
+def user_cache_key(user_id):
+    # версия в ключе: запрос, прочитавший пользователя до сохранения,
+    # кладет его под старую версию, которую уже никто не читает
+    return f'users:user:{user_id}:{get_version(user_version_key(user_id))}'
+
+
+def forget_user(user_id):
+    bump_version(user_version_key(user_id))
+
+
+def session_matches(session, session_hash):
+    'Сессия выдана этому пользователю, с его нынешним паролем.'
+    session_auth_hash = session.get(auth.HASH_SESSION_KEY)
+    return (
+        session.get(auth.BACKEND_SESSION_KEY)
+        in settings.AUTHENTICATION_BACKENDS
+        and session_auth_hash is not None
+        and constant_time_compare(session_auth_hash, session_hash)
+    )
+
+
+def cached_user(data):
+    """
+    Пользователь из записи кеша. Загружены pk, имя и CACHED_FIELDS,
+    остальные поля (и хеш пароля) читаются из базы при первом обращении,
+    а save() пишет только загруженные поля.
+    """
+    User = auth.get_user_model()
+    values = {
+        User._meta.pk.attname: data['pk'],
+        User.USERNAME_FIELD: data['username'],
+        **{name: data[name] for name in CACHED_FIELDS},
+    }
+    # from_db() ждет значения в порядке полей модели
+    fields = [field.attname for field in User._meta.concrete_fields
+              if field.attname in values]
+    return User.from_db(
+        'default', fields, [values[name] for name in fields])
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = load_user(request)
+    return request._cached_user
+
+
+def load_user(request):
+    # сессия и пароль - только из default: реплика могла их еще не получить
+    with use_primary():
+        user_id = request.session.get(auth.SESSION_KEY)
+        if user_id is None:
+            return auth.get_user(request)
+        # версия читается раньше базы, иначе гонка с forget_user()
+        key = user_cache_key(user_id)
+        data = cache.get(key)
+        # неактивного пользователя проверяет бэкенд: ModelBackend его не
+        # пускает. update(is_active=False) сигнала не шлет, такая запись
+        # живет до USER_CACHE_TIMEOUT
+        if data is not None and data['is_active'] and session_matches(
+                request.session, data['session_hash']):
+            return cached_user(data)
+        user = auth.get_user(request)
+    if user.is_authenticated:
+        # в общем кеше нет хеша пароля, только то, что нужно запросу
+        cache.set(key, {
+            'pk': user.pk,
+            'username': user.get_username(),
+            **{name: getattr(user, name) for name in CACHED_FIELDS},
+            'session_hash': user.get_session_auth_hash(),
+        }, settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . middleware import forget_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    'Новый пароль, имя или удаление сразу видны всем запросам.'
+    user_id = instance.pk
+    forget_user(user_id)
+    # запрос мог прочитать старую строку до фиксации и положить её
+    # под новую версию: после фиксации версия меняется еще раз
+    transaction.on_commit(lambda: forget_user(user_id))
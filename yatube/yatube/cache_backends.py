@@ -0,0 +1,285 @@
+"""
+Общий для всех процессов кеш в файле SQLite.
+
+LocMemCache живет внутри процесса: у каждого воркера WSGI своя холодная
+копия, а cache.clear() в одном воркере не трогает остальные. Здесь все
+процессы читают и пишут один файл (режим WAL: читатели не ждут писателя),
+размер ограничен, а при переполнении вытесняются давно не читанные ключи.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache_backends.SQLiteCache',
+            'LOCATION': '/path/to/cache.sqlite3',
+            'OPTIONS': {'MAX_SIZE': 64 * 1024 * 1024},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    # общий размер и число ключей ведут триггеры, чтобы не считать SUM()
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    'id INTEGER PRIMARY KEY CHECK (id = 0), '
+    'size INTEGER NOT NULL, entries INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_stats_insert AFTER INSERT ON cache '
+    'BEGIN UPDATE cache_stats SET size = size + new.size, '
+    'entries = entries + 1; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_stats_delete AFTER DELETE ON cache '
+    'BEGIN UPDATE cache_stats SET size = size - old.size, '
+    'entries = entries - 1; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_stats_update '
+    'AFTER UPDATE OF size ON cache '
+    'BEGIN UPDATE cache_stats SET size = size - old.size + new.size; END',
+]
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кеш Django в одном файле SQLite, общий для процессов и потоков.
+
+    OPTIONS:
+        MAX_SIZE - предел суммарного размера значений в байтах;
+        MAX_ENTRIES, CULL_FREQUENCY - как у остальных бэкендов Django;
+        BUSY_TIMEOUT - сколько секунд ждать блокировку записи;
+        LRU_RESOLUTION - чаще этого время чтения ключа не обновляется,
+            чтобы чтение почти никогда не превращалось в запись.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._lru_resolution = float(options.get('LRU_RESOLUTION', 1))
+        self._local = threading.local()
+
+    # соединения
+
+    def _connection(self):
+        local = self._local
+        # после fork() соединение родителя использовать нельзя
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=self._busy_timeout, isolation_level=None,
+            check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with _Transaction(connection):
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    def _write(self):
+        'Транзакция записи: BEGIN IMMEDIATE сразу берет блокировку.'
+        return _Transaction(self._connection())
+
+    # служебное
+
+    def _expiry(self, timeout):
+        # get_backend_timeout() уже возвращает момент истечения
+        return self.get_backend_timeout(timeout)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _store(self, connection, key, value, expires, now):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (key, blob, expires, now, len(blob)))
+
+    def _cull(self, connection, now):
+        'Убирает просроченное, затем давно не читанное сверх пределов.'
+        size, entries = connection.execute(
+            'SELECT size, entries FROM cache_stats').fetchone()
+        if size <= self._max_size and entries <= self._max_entries:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        while True:
+            size, entries = connection.execute(
+                'SELECT size, entries FROM cache_stats').fetchone()
+            if size <= self._max_size and entries <= self._max_entries:
+                return
+            # как CULL_FREQUENCY у Django: удаляем 1/N ключей за проход
+            count = max(1, entries // max(self._cull_frequency, 1))
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', (count,))
+
+    def _touch_read(self, connection, keys_accessed, now):
+        stale = [key for key, accessed in keys_accessed
+                 if now - accessed > self._lru_resolution]
+        if not stale:
+            return
+        # чтение не ждет писателя: без этого UPDATE простоял бы до
+        # BUSY_TIMEOUT секунд, а LRU подождет следующего чтения
+        connection.execute('PRAGMA busy_timeout = 0')
+        try:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in stale])
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute(
+                f'PRAGMA busy_timeout = {int(self._busy_timeout * 1000)}')
+
+    # API кеша Django
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            return default
+        self._touch_read(connection, [(key, accessed)], now)
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        connection = self._connection()
+        now = time.time()
+        placeholders = ','.join('?' * len(made))
+        rows = connection.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})', list(made)).fetchall()
+        result = {}
+        fresh = []
+        for key, value, expires, accessed in rows:
+            if expires is None or expires > now:
+                result[made[key]] = pickle.loads(value)
+                fresh.append((key, accessed))
+        self._touch_read(connection, fresh, now)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            self._store(connection, key, value, self._expiry(timeout), now)
+            self._cull(connection, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self._expiry(timeout)
+        with self._write() as connection:
+            for key, value in data.items():
+                self._store(connection, self._key(key, version), value,
+                            expires, now)
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and (row[0] is None or row[0] > now):
+                return False
+            self._store(connection, key, value, self._expiry(timeout), now)
+            self._cull(connection, now)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), key, now))
+            return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        # get() + set() из BaseCache не атомарны между процессами
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            self._store(connection, key, value, row[1], now)
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        made = [self._key(key, version) for key in keys]
+        with self._write() as connection:
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in made])
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # соединение живет весь процесс: открывать файл на каждый запрос
+        # дороже, чем держать его открытым
+        pass
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            try:
+                self.connection.execute('COMMIT')
+            except BaseException:
+                # иначе соединение процесса осталось бы внутри транзакции
+                self.connection.execute('ROLLBACK')
+                raise
+        else:
+            self.connection.execute('ROLLBACK')
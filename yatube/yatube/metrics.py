@@ -0,0 +1,427 @@
+"""
+Метрики представлений в текстовом формате Prometheus.
+
+MetricsMiddleware считает для каждого имени маршрута (index, post, ...)
+гистограмму времени ответа, число и время запросов к базе, время
+рендеринга шаблонов и размер ответа. Каждый процесс копит метрики в памяти
+и раз в METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл в
+METRICS_DIR; /metrics складывает файлы всех воркеров. На запрос приходится
+несколько обращений к словарю под блокировкой, без записи в базу.
+
+ServerTimingMiddleware для отдельных запросов показывает те же замеры
+(SQL, шаблоны, поиск миниатюр) в заголовке Server-Timing и журнале.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils.functional import empty
+
+# границы корзин гистограммы времени ответа, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# счетчики на каждое представление: имя метрики -> описание
+COUNTERS = {
+    'db_queries': ('yatube_db_queries_total',
+                   'Запросы к базе данных.'),
+    'db_seconds': ('yatube_db_query_seconds_total',
+                   'Время запросов к базе данных, секунды.'),
+    'template_seconds': ('yatube_template_render_seconds_total',
+                         'Время рендеринга шаблонов, секунды.'),
+    'response_bytes': ('yatube_response_bytes_total',
+                       'Размер ответов, байты.'),
+}
+
+# строки журнала доступа ServerTimingMiddleware, по одному JSON на запрос
+access_logger = logging.getLogger('yatube.access')
+
+_local = threading.local()
+
+
+# время частей запроса
+
+class RequestTimings:
+    'Сколько времени запрос провел в базе, шаблонах и т. п.'
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, kind, seconds):
+        self.seconds[kind] = self.seconds.get(kind, 0) + seconds
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    @property
+    def db_queries(self):
+        return self.counts.get('db', 0)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+
+def current_timings():
+    'Замеры текущего запроса или None вне запроса.'
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def timed(kind):
+    'Добавляет время блока к замерам текущего запроса.'
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings()
+        if timings is not None:
+            timings.add(kind, time.perf_counter() - started)
+
+
+@contextmanager
+def request_timings():
+    """
+    Замеры на время запроса: запросы ко всем базам и явные timed().
+    Вложенный вызов отдает уже начатые замеры, ничего не подключая заново.
+    """
+    timings = current_timings()
+    if timings is not None:
+        yield timings
+        return
+    timings = RequestTimings()
+    _local.timings = timings
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.execute_wrapper))
+            yield timings
+    finally:
+        _local.timings = None
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # вложенные {% include %} не проходят через бэкенд: время
+        # считается один раз, целиком за страницу
+        with timed('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    'Бэкенд шаблонов Django, который замеряет время рендеринга.'
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# накопление и сложение метрик
+
+def empty_view_metrics():
+    return {
+        'requests': {},
+        'buckets': [0] * (len(BUCKETS) + 1),
+        'duration_seconds': 0.0,
+        **{name: 0 for name in COUNTERS},
+    }
+
+
+def merge(total, metrics):
+    for view, values in metrics.items():
+        into = total.setdefault(view, empty_view_metrics())
+        for status, count in values['requests'].items():
+            into['requests'][status] = into['requests'].get(status, 0) + count
+        into['buckets'] = [
+            a + b for a, b in zip(into['buckets'], values['buckets'])]
+        for name in ('duration_seconds', *COUNTERS):
+            into[name] += values[name]
+    return total
+
+
+class Registry:
+    'Метрики процесса; после fork() дочерний процесс начинает с нуля.'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _check_process(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            # pid может достаться новому процессу: имя с временем старта
+            self.filename = f'{self.pid}-{int(time.time() * 1000)}.json'
+            self.views = {}
+            self.flushed = time.monotonic()
+
+    def observe(self, view, status, duration, timings, size):
+        with self.lock:
+            self._check_process()
+            values = self.views.setdefault(view, empty_view_metrics())
+            status = str(status)
+            values['requests'][status] = values['requests'].get(status, 0) + 1
+            bucket = next(
+                (index for index, bound in enumerate(BUCKETS)
+                 if duration <= bound), len(BUCKETS))
+            values['buckets'][bucket] += 1
+            values['duration_seconds'] += duration
+            values['db_queries'] += timings.db_queries
+            values['db_seconds'] += timings.seconds.get('db', 0)
+            values['template_seconds'] += timings.seconds.get('template', 0)
+            values['response_bytes'] += size
+            due = (time.monotonic() - self.flushed
+                   >= settings.METRICS_FLUSH_INTERVAL)
+            snapshot = json.dumps(self.views) if due else None
+            if due:
+                self.flushed = time.monotonic()
+        if snapshot is not None:
+            self.write(snapshot)
+
+    def write(self, snapshot):
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.filename)
+        # атомарная замена: /metrics не увидит недописанный файл
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as output:
+            output.write(snapshot)
+        os.replace(temporary, path)
+
+    def absorb_dead(self):
+        """
+        Забирает в свои метрики файлы завершившихся процессов и удаляет
+        их: иначе каждый перезапуск воркера оставлял бы файл в
+        METRICS_DIR, а простое удаление уменьшило бы счетчики.
+        Живость процесса проверяется только в POSIX.
+        """
+        directory = settings.METRICS_DIR
+        if os.name != 'posix' or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if not name.endswith(('.json', '.json.tmp')):
+                continue
+            pid = file_pid(name)
+            if pid is None or process_alive(pid):
+                continue
+            path = os.path.join(directory, name)
+            if name.endswith('.tmp'):
+                # недописанный файл упавшего процесса
+                remove_quietly(path)
+                continue
+            # переименование забирает файл: другой процесс его уже не найдет
+            claimed = f'{path}.{os.getpid()}.claimed'
+            try:
+                os.replace(path, claimed)
+                with open(claimed) as source:
+                    metrics = json.load(source)
+            except (OSError, ValueError):
+                remove_quietly(claimed)
+                continue
+            with self.lock:
+                self._check_process()
+                merge(self.views, metrics)
+                snapshot = json.dumps(self.views)
+            self.write(snapshot)
+            remove_quietly(claimed)
+
+    def collect(self):
+        'Сумма метрик всех процессов; свои - из памяти, а не из файла.'
+        self.absorb_dead()
+        with self.lock:
+            self._check_process()
+            own = json.loads(json.dumps(self.views))
+            filename = self.filename
+        total = merge({}, own)
+        directory = settings.METRICS_DIR
+        if not os.path.isdir(directory):
+            return total
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == filename:
+                continue
+            try:
+                with open(os.path.join(directory, name)) as source:
+                    merge(total, json.load(source))
+            except (OSError, ValueError):
+                # файл мог исчезнуть или оказаться чужим
+                continue
+        return total
+
+
+registry = Registry()
+
+
+def file_pid(name):
+    'pid процесса из имени файла метрик ({pid}-{ms}.json) или None.'
+    pid = name.split('-', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # процесс есть, но чужой
+        return True
+    return True
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def render_metrics(metrics):
+    'Текстовый формат Prometheus (exposition format 0.0.4).'
+    lines = [
+        '# HELP yatube_requests_total Запросы по представлениям и кодам.',
+        '# TYPE yatube_requests_total counter',
+    ]
+    views = sorted(metrics)
+    for view in views:
+        for status, count in sorted(metrics[view]['requests'].items()):
+            lines.append(
+                f'yatube_requests_total{{view="{view}",status="{status}"}} '
+                f'{count}')
+    lines += [
+        '# HELP yatube_request_duration_seconds Время ответа, секунды.',
+        '# TYPE yatube_request_duration_seconds histogram',
+    ]
+    for view in views:
+        values = metrics[view]
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), values['buckets']):
+            cumulative += count
+            lines.append(
+                f'yatube_request_duration_seconds_bucket'
+                f'{{view="{view}",le="{bound}"}} {cumulative}')
+        lines.append(f'yatube_request_duration_seconds_sum{{view="{view}"}} '
+                     f'{values["duration_seconds"]}')
+        lines.append(
+            f'yatube_request_duration_seconds_count{{view="{view}"}} '
+            f'{cumulative}')
+    for name, (metric, help_text) in COUNTERS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for view in views:
+            lines.append(f'{metric}{{view="{view}"}} {metrics[view][name]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    'Метрики всех воркеров для Prometheus.'
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(
+        render_metrics(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    'Записывает метрики каждого запроса под именем его маршрута.'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with request_timings() as timings:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view, response.status_code, duration, timings, size)
+        return response
+
+
+# части запроса в Server-Timing: вид замера -> (имя, описание);
+# в описании только ASCII: заголовки ответа кодируются latin-1
+SERVER_TIMING_PARTS = (
+    ('db', 'db', 'SQL'),
+    ('template', 'tpl', 'Templates, including thumbnails'),
+    ('thumbnail', 'thumb', 'Thumbnail lookups'),
+)
+
+
+def server_timing(duration, timings):
+    'Значение заголовка Server-Timing, миллисекунды; count - число замеров.'
+    parts = []
+    for kind, name, description in SERVER_TIMING_PARTS:
+        if kind in timings.counts:
+            parts.append(
+                f'{name};dur={timings.seconds[kind] * 1000:.2f};'
+                f'desc="{description}";count={timings.counts[kind]}')
+    parts.append(f'total;dur={duration * 1000:.2f}')
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Раскладывает время выбранных запросов на SQL, шаблоны и миниатюры:
+    заголовок Server-Timing и строка JSON в журнале yatube.access.
+    Замеряется доля SERVER_TIMING_SAMPLE_RATE запросов, остальные
+    проходят без замеров.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if not rate or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+        started = time.perf_counter()
+        # замеры общие с MetricsMiddleware, если он стоит раньше
+        with request_timings() as timings:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(duration, timings)
+        self.log(request, response, duration, timings)
+        return response
+
+    def log(self, request, response, duration, timings):
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        if getattr(user, '_wrapped', None) is empty:
+            # представление не смотрело на пользователя: не загружаем его
+            # ради журнала
+            user = None
+        record = {
+            'time': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match is not None else None,
+            'status': response.status_code,
+            'user': user.pk if user is not None else None,
+            'duration_ms': round(duration * 1000, 2),
+            'db_queries': timings.db_queries,
+            'bytes': None if response.streaming else len(response.content),
+        }
+        for kind, _, _ in SERVER_TIMING_PARTS:
+            record[f'{kind}_ms'] = round(
+                timings.seconds.get(kind, 0) * 1000, 2)
+        record['thumbnails'] = timings.counts.get('thumbnail', 0)
+        access_logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,103 @@
+"""
+Чтение страниц из реплик базы.
+
+ReplicaMiddleware отправляет GET страниц из REPLICA_VIEWS (ленты, профиль,
+пост, about) в одну из REPLICA_DATABASES, выбранную на весь запрос;
+остальные запросы и любая запись идут в default. Реплики отстают от
+default, поэтому после своей записи пользователь REPLICA_PIN_SECONDS
+секунд читает из default (cookie REPLICA_PIN_COOKIE) и видит свой пост,
+комментарий или подписку сразу. Сессии, пользователи и KV store миниатюр
+всегда читаются из default (PRIMARY_APPS).
+
+Локально реплика - копия файла SQLite, которую обновляет sync_replicas.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# эти записи не означают, что пользователь что-то изменил:
+# KV store миниатюр пишется при показе страницы
+UNPINNED_APPS = {'thumbnail'}
+# эти таблицы читаются только из default: только что вошедший или
+# зарегистрированный пользователь и его сессия могут еще не доехать до
+# реплики, а промах KV store миниатюр в реплике sorl надолго запомнил бы
+# в общем кеше
+PRIMARY_APPS = {'sessions', 'auth', 'thumbnail'}
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def current_replica():
+    'Реплика текущего запроса или None, если читаем из default.'
+    return getattr(_local, 'replica', None)
+
+
+@contextmanager
+def use_primary():
+    'Чтение из default внутри блока, даже на странице из REPLICA_VIEWS.'
+    replica = current_replica()
+    _local.replica = None
+    try:
+        yield
+    finally:
+        _local.replica = replica
+
+
+class ReplicaRouter:
+    'Чтение - из реплики запроса, запись - всегда в default.'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return 'default'
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in UNPINNED_APPS:
+            _local.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # в репликах те же данные, что в default
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схему реплика получает вместе с данными
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.replica = None
+        if _local.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.REPLICA_DATABASES
+        use_replica = (
+            replicas
+            and request.method in SAFE_METHODS
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+        if use_replica:
+            _local.replica = random.choice(replicas)
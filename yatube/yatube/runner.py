@@ -0,0 +1,42 @@
+"""
+Тесты не трогают кеш и метрики сайта.
+
+Кеш по умолчанию - файл SQLite в проекте (CACHE_LOCATION), и cache.clear()
+в тестах стирал бы его, а версии лент с timeout=None переживали бы
+прогон; метрики каждого запроса пишутся в METRICS_DIR. TestRunner
+(manage.py test) и tests/conftest.py (pytest) подставляют для них
+временную папку.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def isolated_settings(directory):
+    'Настройки, с которыми тесты пишут только во временную папку directory.'
+    cache = dict(settings.CACHES['default'])
+    if cache['BACKEND'] == 'yatube.cache_backends.SQLiteCache':
+        # файл, а не locmem: кеш по-прежнему общий для процессов
+        cache['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    return {
+        'CACHES': {'default': cache},
+        'METRICS_DIR': os.path.join(directory, 'metrics'),
+    }
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp(prefix='yatube-tests-')
+        self.isolated = override_settings(
+            **isolated_settings(self.directory))
+        self.isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -52,11 +52,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы в метрики попало время всех остальных
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.metrics.ServerTimingMiddleware',
+    # до сессий: их чтение тоже идет в реплику
+    'yatube.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # пользователь из кеша, без запроса к auth_user (users/middleware.py)
+    'users.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # приложения для обработки запросов
@@ -73,7 +79,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для /metrics
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         "DIRS": [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,13 +101,47 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с PRAGMA для одновременных читателей и писателей
+# (yatube/sqlite/base.py); замер - manage.py benchmark_sqlite
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение переживает запрос: не открываем файл и не выполняем
+        # PRAGMA заново, кеш страниц SQLite остается прогретым
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # сколько секунд писатель ждет чужую транзакцию
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                # в WAL без fsync на каждый COMMIT; при сбое питания
+                # теряются последние транзакции, но база цела
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                # отрицательное значение - в килобайтах: 64 МБ
+                'cache_size': -64000,
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
+# Реплики только для чтения (yatube/routers.py) - другие алиасы DATABASES,
+# например копия файла, которую обновляет manage.py sync_replicas:
+# DATABASES['replica'] = dict(DATABASES['default'], NAME=...)
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# страницы (имена маршрутов), которые читают из реплик
+REPLICA_VIEWS = {
+    'index', 'group', 'profile', 'post', 'post_comments', 'follow_index',
+    'about:author', 'about:tech',
+}
+# столько секунд после своей записи пользователь читает из default
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'use_primary'
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -157,9 +198,123 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
-# В Django есть встроенный кеширующий бэкенд locmem.LocMemCache.
-CACHES = {
-    'default': {
+# В Django есть встроенный кеширующий бэкенд locmem.LocMemCache, но он
+# свой у каждого процесса: воркеры не видят записей друг друга.
+# SQLiteCache - общий для всех процессов файл, сверх MAX_SIZE вытесняются
+# давно не читанные ключи. CACHE_BACKEND выбирает один из бэкендов,
+# путь к файлу задает переменная окружения CACHE_LOCATION.
+# Тесты берут кеш во временной папке (yatube/runner.py)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'yatube.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_SIZE': 64 * 1024 * 1024,
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+TEST_RUNNER = 'yatube.runner.TestRunner'
+# Сессии читаются из кеша, в базу - только при промахе и записи
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Сколько секунд пользователь запроса живет в кеше; при сохранении
+# пользователя запись удаляется сразу
+USER_CACHE_TIMEOUT = 300
+# Сколько секунд живут фрагменты лент с постами
+FEED_CACHE_TIMEOUT = 20
+# Защита кешей лент от толпы пересчетов при истечении
+# (get_or_compute в posts/cache.py): истекшее значение еще
+# CACHE_STALE_TIMEOUT секунд отдается, пока один запрос считает новое.
+# Валидаторы лент в ключе фрагмента читаются в каждом запросе, поэтому
+# устаревшее значение не скрывает новые посты и комментарии
+CACHE_STAMPEDE_PROTECTION = True
+CACHE_STALE_TIMEOUT = 60
+CACHE_LOCK_TIMEOUT = 10
+# больше - раньше пересчет до истечения
+CACHE_EARLY_BETA = 1.0
+# Сколько секунд живут целые страницы лент и постов для гостей
+# (posts/conditional.py); сигналы сбрасывают сразу страницы затронутых
+# постов, авторов и групп, а правки и удаления постов - все
+PAGE_CACHE_TIMEOUT = FEED_CACHE_TIMEOUT
+
+# Миниатюры картинок постов создает пул потоков после загрузки;
+# при THUMBNAIL_ASYNC = False они создаются сразу в запросе
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки перекодируются (posts/images.py): длинная сторона
+# не больше IMAGE_MAX_SIZE, без EXIF, progressive JPEG или 'WEBP'.
+# Миниатюры sorl-thumbnail сохраняются в том же формате
+IMAGE_MAX_SIZE = 2048
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+THUMBNAIL_FORMAT = IMAGE_FORMAT
+
+# KV store миниатюр (posts/kvstore.py): перед общим кешем и базой
+# найденные миниатюры помнит сам процесс, не больше
+# THUMBNAIL_LOCAL_CACHE_SIZE штук и THUMBNAIL_LOCAL_CACHE_TIMEOUT секунд
+THUMBNAIL_KVSTORE = 'posts.kvstore.TieredKVStore'
+THUMBNAIL_LOCAL_CACHE_SIZE = 10000
+THUMBNAIL_LOCAL_CACHE_TIMEOUT = 300
+
+# Постраничный вывод лент. CURSOR_PAGINATION включает переход по курсору
+# (WHERE (pub_date, id) < курсор) вместо OFFSET и COUNT(*);
+# старые ссылки ?page=N при этом работают до CURSOR_PAGINATION_LEGACY_PAGES
+POSTS_PER_PAGE = 10
+CURSOR_PAGINATION = False
+CURSOR_PAGINATION_LEGACY_PAGES = 5
+# Комментарии на странице поста всегда идут по курсору, остальные
+# подгружает кнопка "Показать еще"
+COMMENTS_PER_PAGE = 50
+
+# JSON API (posts/api.py): размер страницы по умолчанию и наибольший
+# ?limit=, сколько секунд общие ответы живут в кеше
+API_PAGE_SIZE = POSTS_PER_PAGE
+API_MAX_PAGE_SIZE = 100
+API_CACHE_TIMEOUT = FEED_CACHE_TIMEOUT
+
+# Метрики представлений для Prometheus (yatube/metrics.py): воркеры раз в
+# METRICS_FLUSH_INTERVAL секунд сбрасывают их в METRICS_DIR, /metrics
+# складывает. Отдаются только адресам из METRICS_ALLOWED_IPS (None - всем).
+# Файлы завершившихся воркеров /metrics вливает в свои и удаляет; живость
+# проверяется по pid, поэтому папка - своя у каждого сервера и контейнера.
+# На Windows pid не проверяются: старые файлы удаляют после перезапуска.
+# Тесты пишут метрики во временную папку (yatube/runner.py)
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Доля запросов, время которых раскладывается на SQL, шаблоны и миниатюры
+# в заголовке Server-Timing и в журнале yatube.access (0 - выключено)
+SERVER_TIMING_SAMPLE_RATE = 0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'access': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.access': {
+            'handlers': ['access'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
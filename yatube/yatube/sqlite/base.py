@@ -0,0 +1,71 @@
+"""
+Бэкенд SQLite для сайта под нагрузкой: django.db.backends.sqlite3 плюс
+PRAGMA на каждое новое соединение и режим начала транзакций.
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': '/path/to/db.sqlite3',
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+            },
+        }
+    }
+
+В режиме WAL читатели не ждут писателя. transaction.atomic() со штатным
+BEGIN (DEFERRED) берет блокировку записи только на первом INSERT, и если
+другой писатель успел раньше, SQLite сразу отвечает "database is
+locked", не дожидаясь timeout. BEGIN IMMEDIATE берет её в начале
+транзакции, где ожидание по timeout работает.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# ключи OPTIONS этого бэкенда; остальные уходят в sqlite3.connect()
+OWN_OPTIONS = ('pragmas', 'transaction_mode')
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# значения PRAGMA подставляются в SQL: только имена и целые числа
+PRAGMA_NAME_RE = re.compile(r'^\w+$')
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pragmas(self):
+        return self.settings_dict['OPTIONS'].get('pragmas', {})
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}')
+        return mode
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for key in OWN_OPTIONS:
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            valid = (PRAGMA_NAME_RE.match(name)
+                     and PRAGMA_VALUE_RE.match(str(value)))
+            if not valid:
+                raise ImproperlyConfigured(f'Неверная PRAGMA {name}={value}')
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -4,6 +4,9 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from posts.storage import serve_immutable
+from .metrics import metrics_view
+
 # переменные содержащие  адреса view-функций страниц с ошибками
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -19,10 +22,16 @@ urlpatterns = [
     #  раздел администратора
     path('admin/', admin.site.urls),
 
+    #  JSON API только для чтения (см. posts/api.py)
+    path('api/v1/', include('posts.api_urls')),
+
     #  обработчик для главной страницы ищем в urls.py приложения posts
     path('', include('posts.urls')),
 
     path('about/', include('about.urls', namespace='about')),
+
+    #  метрики для Prometheus (см. yatube/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
 ]
 # # Доступность файлов загруженных пользователями в режиме отладки:
 # Этот код будет работать, когда ваш сайт в режиме отладки. Он позволяет
@@ -31,7 +40,8 @@ urlpatterns = [
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+        settings.MEDIA_URL, view=serve_immutable,
+        document_root=settings.MEDIA_ROOT)
     urlpatterns += static(
         settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += (path("__debug__/", include(debug_toolbar.urls)),)
@@ -0,0 +1,37 @@
+"""
+Процессы пула (multiprocessing) для команд manage.py.
+
+При spawn (Windows, macOS) процесс пула начинает с чистого
+интерпретатора: Django настраивает init_worker() до первой задачи.
+Поэтому модуль не импортирует модели - распаковка инициализатора
+случается раньше django.setup().
+"""
+import django
+from django.db import connections
+from django.test import override_settings
+
+
+def use_database(config):
+    'Подменяет default в connections, не закрывая прежнее соединение.'
+    # новое соединение создаст connections['default'] по этим настройкам
+    try:
+        del connections['default']
+    except AttributeError:
+        # в этом потоке соединения еще не было
+        pass
+    connections.databases['default'] = config
+
+
+def init_worker(database=None, overrides=None):
+    """
+    Настраивает Django в процессе пула. При fork процесс получает свои
+    соединения вместо унаследованных; database - настройки default,
+    если родитель подменил базу через use_database(), overrides -
+    настройки, которые родитель поменял через override_settings.
+    """
+    django.setup()
+    if overrides:
+        override_settings(**overrides).enable()
+    connections.close_all()
+    if database is not None:
+        use_database(database)